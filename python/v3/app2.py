@@ -1,21 +1,46 @@
 #!/usr/bin/env python
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_from_directory, Response, stream_with_context, g
 import json
+import logging
 import os
 import base64
-import requests
-import subprocess
-import tempfile
-import shutil
+import threading
+import time
+import yaml
 from pathlib import Path
 from dotenv import load_dotenv
 
+from batch_commit import BatchCommitError, GitTreesCommitter, MirrorCommitter, normalize_changes
+from change_feed import ChangeFeed
+from config_history import ConfigHistory, HistoryError, parse_document
+from device_bundles import DeviceBundles, DeviceNotFound
+from feasibility import FeasibilityService, summarize, violation_names
+from file_manifest import ManifestIndex
+from github_transport import GitHubTransport
+from instrumentation import HTTP_REQUESTS, METRICS, configure_logging, phase
+from json_patch import (
+    JsonPatchError, JsonPatchTestFailed, apply_json_patch, apply_merge_patch,
+    diff_paths, json_patch_paths, merge_patch_paths, paths_overlap
+)
+from overrides_cache import Snapshot, SnapshotCache, UpstreamError, derive_overrides
+from process_lock import ProcessLock
+from repo_files import RepoFiles
+from repo_mirror import RepoMirror
+from task_table import TaskTableCache
+from telemetry import StepTelemetryPublisher, TelemetryConfigSource, parse_samples
+from tf_graph import FrameError, FrameGraphSource, Transform
+from validation import SchemaValidator
+from write_queue import WriteConflict, WriteQueue
+
+log = logging.getLogger(__name__)
+
 class VisualizerApp:
     """TwoBarVisualizer Application Class - Focused on Overrides"""
     
     def __init__(self):
         # Load environment variables
         load_dotenv()
+        configure_logging()
         
         # Initialize paths
         self.base_path = Path(__file__).parent
@@ -24,28 +49,143 @@ class VisualizerApp:
         # Load configuration
         self.config = self._load_config()
         
+        # Compile JSON schemas once for every write endpoint
+        self.validator = SchemaValidator()
+        self.data_dir = Path(os.environ.get('DATA_DIR', self.base_path.parent.parent / 'data'))
+        
         # GitHub configuration
         self.github_token = os.environ.get('GITHUB_TOKEN')
         self.github_owner = os.environ.get('GITHUB_OWNER', 'DongjuneChang')
         self.github_repo = os.environ.get('GITHUB_REPO', 'AR_info_data')
+        self.github_branch = os.environ.get('GITHUB_BRANCH', 'master')
         self.overrides_path = os.environ.get(
             'OVERRIDES_PATH', 
             'visualization/visualization_overrides.json'
         )
         
+        # Pooled GitHub API transport (GITHUB_API_URL can point at a local stand-in)
+        self.github = GitHubTransport(
+            base_url=os.environ.get('GITHUB_API_URL', 'https://api.github.com'),
+            token=self.github_token,
+            connect_timeout=float(os.environ.get('GITHUB_CONNECT_TIMEOUT', '3.05')),
+            read_timeout=float(os.environ.get('GITHUB_READ_TIMEOUT', '10')),
+            max_retries=int(os.environ.get('GITHUB_MAX_RETRIES', '3'))
+        )
+        
+        # Read cache configuration
+        self.cache_ttl = float(os.environ.get('OVERRIDES_CACHE_TTL', '5'))
+        
         # Deploy Key configuration
         self.use_deploy_key = os.environ.get('USE_DEPLOY_KEY', 'false').lower() == 'true'
         self.deploy_key_path = os.environ.get('DEPLOY_KEY_PATH')
+        self.mirror_sync_interval = float(os.environ.get('MIRROR_SYNC_INTERVAL', '30'))
+        # Persistent clone, reused across restarts
+        self.mirror_dir = os.environ.get('MIRROR_DIR') or os.path.join(
+            os.path.expanduser('~'), '.cache', 'twobar_visualizer',
+            f"{self.github_owner}_{self.github_repo}"
+        )
+        self.git_remote_url = os.environ.get(
+            'GIT_REMOTE_URL', f"git@github.com:{self.github_owner}/{self.github_repo}.git"
+        )
         
-        # Temporary directory for git operations
-        self.temp_dir = None
+        self.mirror = None
         if self.use_deploy_key:
             if not self.deploy_key_path:
-                print("WARNING: USE_DEPLOY_KEY is true but DEPLOY_KEY_PATH is not set")
+                log.warning("USE_DEPLOY_KEY is true but DEPLOY_KEY_PATH is not set")
             else:
-                # Create temporary directory for git operations
-                self.temp_dir = tempfile.mkdtemp()
                 self._setup_git_repo()
+                # The lock file lives next to the clone, so its parent must exist first
+                os.makedirs(os.path.dirname(os.path.abspath(self.mirror_dir)), exist_ok=True)
+                # Git operations are serialized on a lock file, so an overlapping
+                # restart cannot corrupt the clone. start() does not block on the
+                # network: a missing clone is made in the background and reads
+                # answer 503 until it is ready
+                self.mirror = RepoMirror(
+                    self.mirror_dir, branch=self.github_branch,
+                    interval=self.mirror_sync_interval,
+                    lock=ProcessLock(os.path.abspath(self.mirror_dir) + '.lock'),
+                    watch_interval=float(os.environ.get('MIRROR_WATCH_INTERVAL', '0.2')),
+                    clone_url=self.git_remote_url
+                )
+                self.mirror.start()
+        
+        # Multi-file writes land as a single commit in either mode
+        self.mirror_committer = MirrorCommitter(self.mirror, self.github_branch) if self.mirror else None
+        self.trees_committer = GitTreesCommitter(
+            self.github, self.github_owner, self.github_repo, self.github_branch
+        )
+        
+        # Shared snapshot cache for /overrides and /color-keys
+        self.overrides_cache = SnapshotCache(
+            self._fetch_overrides,
+            ttl=self.cache_ttl,
+            derive=derive_overrides
+        )
+        
+        # Change feed for devices; fed by every new cached version (our writes included)
+        self.change_feed = ChangeFeed()
+        self.overrides_cache.add_listener(
+            lambda snapshot: self.change_feed.publish(snapshot.sha, snapshot.document)
+        )
+        # Each long-poll or SSE stream holds a server thread; wsgi.py adds this many
+        # threads to the pool and further subscribers get 503, so requests never starve
+        self.feed_max_subscribers = int(os.environ.get('CHANGE_FEED_MAX_SUBSCRIBERS', '32'))
+        self._feed_slots = threading.BoundedSemaphore(self.feed_max_subscribers)
+        
+        # Repository-wide file access and per-device boot bundles
+        self.repo_files = RepoFiles(
+            self.github, self.github_owner, self.github_repo,
+            mirror=self.mirror, ttl=self.cache_ttl, branch=self.github_branch
+        )
+        self.device_bundles = DeviceBundles(self.repo_files)
+        self.manifest = ManifestIndex(self.repo_files)
+        self.frame_graph = FrameGraphSource(self.repo_files)
+        self.task_tables = TaskTableCache(os.environ.get('TASK_CACHE_DIR'))
+        self.feasibility = FeasibilityService(
+            self.repo_files, self.task_tables,
+            task_scale=float(os.environ.get('TASK_UNIT_SCALE', '0.01'))
+        )
+        
+        # Optional ZeroMQ step-length publisher (needs pyzmq)
+        self.telemetry_config = TelemetryConfigSource(self.repo_files)
+        self.telemetry = None
+        if os.environ.get('TELEMETRY_ENABLED', 'false').lower() == 'true':
+            self.telemetry = StepTelemetryPublisher(
+                self.telemetry_config,
+                bind_host=os.environ.get('TELEMETRY_BIND_HOST', '*'),
+                input_endpoint=os.environ.get('TELEMETRY_INPUT') or None,
+                batch_interval=float(os.environ.get('TELEMETRY_BATCH_MS', '10')) / 1000.0,
+                max_batch=int(os.environ.get('TELEMETRY_MAX_BATCH', '256')),
+                buffer_size=int(os.environ.get('TELEMETRY_BUFFER', '4096')),
+                sndhwm=int(os.environ.get('TELEMETRY_SNDHWM', '100'))
+            )
+            self.telemetry.start()
+        if self.mirror:
+            self.mirror.add_listener(self._on_mirror_update)
+            # Re-hash written files right after each commit
+            self.mirror.add_listener(self.manifest.update)
+            if self.mirror.ready:
+                threading.Thread(target=self.device_bundles.precompute_all, daemon=True).start()
+        
+        # Per-file version index for /history (deploy-key mirror only)
+        self.history = ConfigHistory(self.mirror) if self.mirror else None
+        if self.history:
+            self.mirror.add_listener(self.history.update)
+            self.history.start()
+        
+        self._feed_watcher = threading.Thread(
+            target=self._watch_overrides, name='overrides-watcher', daemon=True
+        )
+        self._feed_watcher.start()
+        
+        # Asynchronous, coalescing write pipeline for POST /overrides
+        self.write_queue = WriteQueue(
+            self._apply_overrides_write,
+            self._current_overrides_version,
+            same_version=self._same_overrides_version,
+            debounce=float(os.environ.get('OVERRIDES_WRITE_DEBOUNCE', '0.5')),
+            max_delay=float(os.environ.get('OVERRIDES_WRITE_MAX_DELAY', '3'))
+        )
         
         # Initialize Flask app
         # Use absolute paths for template and static folders
@@ -53,13 +193,19 @@ class VisualizerApp:
         template_folder = str(current_dir / 'templates')
         static_folder = str(current_dir / 'static')
         
-        print(f"Using template folder: {template_folder}")
-        print(f"Using static folder: {static_folder}")
+        log.info("Using template and static folders",
+                 extra={'template_folder': template_folder, 'static_folder': static_folder})
         
         self.app = Flask(__name__, 
                         static_folder=static_folder,
                         template_folder=template_folder)
         
+        # Scrape-time gauges for /metrics
+        METRICS.gauge('visualizer_change_feed_subscribers', 'Devices waiting on the change feed',
+                      lambda: self.change_feed.subscribers)
+        METRICS.gauge('visualizer_github_rate_limit_remaining', 'GitHub API calls left in the window',
+                      lambda: self.github.rate_limit['remaining'])
+        
         # Register routes
         self._register_routes()
 
@@ -77,179 +223,266 @@ class VisualizerApp:
             return config
 
     def __del__(self):
-        """Clean up temporary directory"""
-        if self.temp_dir and os.path.exists(self.temp_dir):
-            shutil.rmtree(self.temp_dir)
+        """Stop the mirror worker (the clone is kept for the next start)"""
+        if getattr(self, 'mirror', None):
+            self.mirror.stop()
+        if getattr(self, 'history', None):
+            self.history.stop()
+        if getattr(self, 'telemetry', None):
+            self.telemetry.stop()
     
     def _setup_git_repo(self):
-        """Setup git repository with deploy key"""
-        try:
-            # Clone repository
-            repo_url = f"git@github.com:{self.github_owner}/{self.github_repo}.git"
-            ssh_command = f"ssh -i {self.deploy_key_path} -o StrictHostKeyChecking=no"
-            
-            # Set GIT_SSH_COMMAND environment variable
-            os.environ["GIT_SSH_COMMAND"] = ssh_command
-            
-            # Clone repository
-            subprocess.run(
-                ["git", "clone", repo_url, self.temp_dir],
-                check=True,
-                capture_output=True
-            )
-            
-            print(f"Successfully cloned repository to {self.temp_dir}")
-        except subprocess.CalledProcessError as e:
-            print(f"Error setting up git repository: {e.stderr.decode()}")
-            if self.temp_dir and os.path.exists(self.temp_dir):
-                shutil.rmtree(self.temp_dir)
-            self.temp_dir = None
+        """Make git use the deploy key; the mirror clones on its own thread"""
+        ssh_command = f"ssh -i {self.deploy_key_path} -o StrictHostKeyChecking=no"
+        
+        # Set GIT_SSH_COMMAND environment variable
+        os.environ["GIT_SSH_COMMAND"] = ssh_command
     
-    def _github_request(self, method, data=None):
+    def _github_request(self, method, data=None, extra_headers=None):
         """Handle GitHub API requests"""
         # If using deploy key, use git commands instead of GitHub API
-        if self.use_deploy_key and self.temp_dir and method.upper() == 'GET':
-            return self._git_get_file()
-        elif self.use_deploy_key and self.temp_dir and method.upper() == 'PUT':
+        if self.use_deploy_key and self.mirror and method.upper() == 'GET':
+            return self._git_get_file(extra_headers)
+        elif self.use_deploy_key and self.mirror and method.upper() == 'PUT':
             return self._git_put_file(data)
         
         # Otherwise use GitHub API
-        headers = {
-            "Accept": "application/vnd.github.v3+json"
-        }
-        
-        # Add authorization header if token is available
-        if self.github_token:
-            headers["Authorization"] = f"token {self.github_token}"
-        
-        url = f"https://api.github.com/repos/{self.github_owner}/{self.github_repo}/contents/{self.overrides_path}"
+        path = f"/repos/{self.github_owner}/{self.github_repo}/contents/{self.overrides_path}"
         
         if method.upper() == 'GET':
             # For public repos, GET requests don't require a token
-            return requests.get(url, headers=headers)
+            return self.github.get(path, headers=extra_headers)
         elif method.upper() == 'PUT':
             if not self.github_token:
                 raise ValueError("GitHub token required for PUT requests")
-            return requests.put(url, headers=headers, json=data)
+            return self.github.put(path, headers=extra_headers, json=data)
         else:
             raise ValueError(f"Unsupported method: {method}")
     
-    def _git_get_file(self):
-        """Get file using git commands"""
+    def _fetch_overrides(self, etag=None):
+        """Fetch overrides upstream, conditionally when an ETag is known"""
+        extra_headers = {'If-None-Match': etag} if etag else None
+        return self._github_request('GET', extra_headers=extra_headers)
+    
+    def _on_mirror_update(self, old, new, changed):
+        """Refresh caches and bundles as soon as the mirror sees a new version"""
+        self.overrides_cache.invalidate()
+        if old is None:
+            # First snapshot of a lazily cloned mirror
+            threading.Thread(target=self.device_bundles.precompute_all, daemon=True).start()
+            return
+        if self.overrides_path in changed:
+            self.overrides_cache.get()
+        if changed & self.device_bundles.input_paths():
+            threading.Thread(target=self.device_bundles.precompute_all, daemon=True).start()
+        if changed & self.feasibility.input_paths():
+            threading.Thread(target=self._check_feasibility, daemon=True).start()
+        if self.telemetry and changed & self.telemetry_config.input_paths():
+            self.telemetry.reload()
+    
+    def _check_feasibility(self, changed=None):
+        """Re-check the task table after params.yaml or a task CSV was saved"""
         try:
-            # Pull latest changes
-            subprocess.run(
-                ["git", "pull", "origin", "master"],
-                cwd=self.temp_dir,
-                check=True,
-                capture_output=True
-            )
-            
-            # Read file
-            file_path = os.path.join(self.temp_dir, self.overrides_path)
-            with open(file_path, 'r') as f:
-                content = f.read()
-            
-            # Create response-like object
-            class GitResponse:
-                def __init__(self, content):
-                    self.status_code = 200
-                    self._content = content
-                
-                def json(self):
-                    return {
-                        'content': base64.b64encode(self._content.encode()).decode(),
-                        'sha': 'git'  # Use 'git' as sha for git operations
-                    }
+            if changed is not None and not changed & self.feasibility.input_paths():
+                return
+            report = self.feasibility.check()
+            level = logging.WARNING if report['infeasible'] else logging.INFO
+            log.log(level, "Feasibility check finished", extra={
+                'path': report['path'], 'infeasible': report['infeasible'], 'checked': report['checked']
+            })
+        except Exception:
+            log.exception("Feasibility check failed")
+    
+    def _watch_overrides(self):
+        """Revalidate upstream while devices are waiting on the change feed"""
+        while True:
+            time.sleep(max(self.cache_ttl, 1.0))
+            if self.change_feed.subscribers == 0:
+                continue
+            try:
+                self.overrides_cache.get()
+            except Exception as e:
+                log.warning("Overrides watcher failed", extra={'error': str(e)})
+    
+    def _current_overrides_version(self):
+        """Return the upstream overrides snapshot, bypassing the read cache TTL"""
+        if self.mirror:
+            self.mirror.sync()
+        return self.overrides_cache.get(max_age=0)
+    
+    def _same_overrides_version(self, sha_a, sha_b):
+        """Check whether two versions hold the same overrides file"""
+        if sha_a == sha_b:
+            return True
+        if self.mirror:
+            # In deploy key mode versions are commits; compare the file's blob
+            blob_a = self.mirror.blob_at(sha_a, self.overrides_path)
+            return blob_a is not None and blob_a == self.mirror.blob_at(sha_b, self.overrides_path)
+        return False
+
+    def _overrides_version(self, sha):
+        """Return the overrides snapshot at version `sha`, or None if unknown
+
+        The cache only keeps the last few versions; in deploy key mode an
+        older commit is read back from the clone instead.
+        """
+        snapshot = self.overrides_cache.get_version(sha)
+        if snapshot is not None or not self.history:
+            return snapshot
+        try:
+            commit, content = self.history.content(self.overrides_path, sha)
+        except HistoryError:
+            return None
+        if content is None:
+            return None
+        return Snapshot(commit, content.decode('utf-8'), derive=derive_overrides)
+
+    def _apply_overrides_write(self, content, base_sha, message):
+        """Write one merged overrides document upstream and return the new sha"""
+        payload = {
+            "message": message,
+            "content": base64.b64encode(content.encode()).decode(),
+            "sha": base_sha
+        }
+        
+        response = self._github_request('PUT', payload)
+        if response.status_code == 409:
+            raise WriteConflict(f"Overrides changed upstream: {response.text}")
+        if response.status_code not in [200, 201]:
+            log.error("Overrides write failed", extra={'status': response.status_code, 'error': response.text})
+            raise Exception(f"GitHub API returned status code {response.status_code}: {response.text}")
+        
+        new_sha = response.json()['content']['sha']
+        self.overrides_cache.prime(new_sha, content)
+        # Let the manifest (and other RepoFiles readers) see the write without waiting for the TTL
+        self.repo_files.invalidate(self.overrides_path)
+        log.info("Applied overrides write", extra={'sha': new_sha, 'base_sha': base_sha})
+        return new_sha
+    
+    def _git_get_file(self, extra_headers=None):
+        """Get file from the in-memory mirror snapshot (no git subprocess)"""
+        snapshot = self.mirror.snapshot
+        content = snapshot.read(self.overrides_path) if snapshot else None
+        
+        # Create response-like object
+        class GitResponse:
+            def __init__(self, status_code, commit, content=None):
+                self.status_code = status_code
+                self.headers = {'ETag': f'"{commit}"'}
+                self.text = ''
+                self._commit = commit
+                self._content = content
             
-            return GitResponse(content)
-        except Exception as e:
+            def json(self):
+                return {
+                    'content': base64.b64encode(self._content).decode(),
+                    'sha': self._commit
+                }
+        
+        if content is None:
             # Create error response-like object
             class GitErrorResponse:
-                def __init__(self, error):
-                    self.status_code = 500
-                    self.text = str(error)
+                def __init__(self, status_code, error):
+                    self.status_code = status_code
+                    self.text = error
             
-            return GitErrorResponse(e)
+            if snapshot is None:
+                return GitErrorResponse(503, f"Mirror is not ready yet: {self.mirror.last_error or 'cloning'}")
+            return GitErrorResponse(404, f"{self.overrides_path} not found in mirror")
+        
+        etag = f'"{snapshot.commit}"'
+        if extra_headers and extra_headers.get('If-None-Match') == etag:
+            return GitResponse(304, snapshot.commit)
+        return GitResponse(200, snapshot.commit, content)
     
     def _git_put_file(self, data):
         """Update file using git commands"""
         try:
-            # Write content to file
-            file_path = os.path.join(self.temp_dir, self.overrides_path)
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            print(f"Writing content to {file_path}")
-            with open(file_path, 'w') as f:
-                content = base64.b64decode(data['content']).decode()
-                f.write(content)
-                print(f"Content written: {content[:100]}...")
-            
-            # Commit and push changes
-            print("Running git add...")
-            add_result = subprocess.run(
-                ["git", "add", self.overrides_path],
-                cwd=self.temp_dir,
-                check=True,
-                capture_output=True
+            content = base64.b64decode(data['content']).decode()
+            # The write queue has already synced the mirror for this batch;
+            # base_commit still catches a commit pushed from elsewhere
+            commit = self.mirror_committer.commit(
+                {self.overrides_path: content},
+                data.get('message', 'Update visualization overrides'),
+                base_commit=data.get('sha'),
+                fetch=False
             )
-            print(f"Git add output: {add_result.stdout.decode()}")
-            
-            print("Running git commit...")
-            commit_message = data.get('message', 'Update visualization overrides')
-            commit_result = subprocess.run(
-                ["git", "commit", "-m", commit_message],
-                cwd=self.temp_dir,
-                check=True,
-                capture_output=True
-            )
-            print(f"Git commit output: {commit_result.stdout.decode()}")
-            
-            print("Running git push...")
-            push_result = subprocess.run(
-                ["git", "push", "origin", "master"],
-                cwd=self.temp_dir,
-                check=False,  # Don't raise exception on error
-                capture_output=True
-            )
-            
-            if push_result.returncode != 0:
-                print(f"Git push error: {push_result.stderr.decode()}")
-                raise Exception(f"Git push failed: {push_result.stderr.decode()}")
-            else:
-                print(f"Git push output: {push_result.stdout.decode()}")
-            
-            # Create response-like object
-            class GitResponse:
-                def __init__(self):
-                    self.status_code = 200
-                
-                def json(self):
-                    return {
-                        'content': {
-                            'sha': 'git'  # Use 'git' as sha for git operations
-                        }
-                    }
+            return self._git_put_result(commit)
+        except WriteConflict as e:
+            # Create error response-like object
+            class GitConflictResponse:
+                def __init__(self, error):
+                    self.status_code = 409
+                    self.text = str(error)
             
-            return GitResponse()
-        except subprocess.CalledProcessError as e:
+            return GitConflictResponse(e)
+        except BatchCommitError as e:
             # Create error response-like object
             class GitErrorResponse:
                 def __init__(self, error):
-                    self.status_code = 500
-                    self.text = error.stderr.decode()
+                    self.status_code = error.status_code
+                    self.text = error.details
             
             return GitErrorResponse(e)
 
+    @staticmethod
+    def _git_put_result(commit):
+        """Build a contents-API-like PUT response for a git commit"""
+        # Create response-like object
+        class GitResponse:
+            def __init__(self, commit):
+                self.status_code = 200
+                self._commit = commit
+            
+            def json(self):
+                return {
+                    'content': {
+                        'sha': self._commit
+                    }
+                }
+        
+        return GitResponse(commit)
+
     def _register_routes(self):
         """Register routes"""
+        # Per-endpoint latency for /metrics
+        self.app.before_request(self._start_timer)
+        self.app.after_request(self._record_request)
+        self.app.after_request(self._retry_while_cloning)
+        
         # Main route
         self.app.route('/')(self.overrides_editor)
         
         # API routes
         self.app.route('/overrides', methods=['GET'])(self.get_overrides)
         self.app.route('/overrides', methods=['POST'])(self.update_overrides)
+        self.app.route('/overrides', methods=['PATCH'])(self.patch_overrides)
+        self.app.route('/overrides/jobs/<job_id>', methods=['GET'])(self.get_write_job)
+        self.app.route('/overrides/changes', methods=['GET'])(self.get_overrides_changes)
+        self.app.route('/overrides/stream', methods=['GET'])(self.stream_overrides)
         self.app.route('/color-keys', methods=['GET'])(self.get_color_keys)
+        self.app.route('/validate', methods=['GET'])(self.validate_all)
+        self.app.route('/devices/<device_id>/bundle', methods=['GET'])(self.get_device_bundle)
+        self.app.route('/manifest', methods=['GET'])(self.get_manifest)
+        self.app.route('/sync', methods=['GET', 'POST'])(self.sync_files)
+        self.app.route('/tf/frames', methods=['GET'])(self.get_tf_frames)
+        self.app.route('/tf/frames/<frame_id>', methods=['PUT'])(self.update_tf_frame)
+        self.app.route('/tf/lookup', methods=['GET'])(self.lookup_tf)
+        self.app.route('/tf/transform', methods=['POST'])(self.transform_tf)
+        self.app.route('/tasks', methods=['GET'])(self.get_tasks)
+        self.app.route('/tasks/<int:exp>', methods=['GET'])(self.get_task_experiment)
+        self.app.route('/feasibility', methods=['GET'])(self.get_feasibility)
+        self.app.route('/feasibility/check', methods=['POST'])(self.check_feasibility)
+        self.app.route('/files/batch', methods=['POST'])(self.batch_update_files)
+        self.app.route('/history', methods=['GET'])(self.get_history_paths)
+        self.app.route('/history/versions', methods=['GET'])(self.get_history_versions)
+        self.app.route('/history/file', methods=['GET'])(self.get_history_file)
+        self.app.route('/history/diff', methods=['GET'])(self.get_history_diff)
+        self.app.route('/history/rollback', methods=['POST'])(self.rollback_history)
+        self.app.route('/telemetry', methods=['GET'])(self.get_telemetry)
+        self.app.route('/telemetry/samples', methods=['POST'])(self.push_telemetry_samples)
+        self.app.route('/mirror/sync', methods=['POST'])(self.sync_mirror)
+        self.app.route('/metrics', methods=['GET'])(self.get_metrics)
         
         # Static files
         self.app.route('/static/<path:filename>')(self.serve_static)
@@ -261,49 +494,18 @@ class VisualizerApp:
     def get_overrides(self):
         """Get visualization overrides from GitHub or git repository"""
         try:
-            response = self._github_request('GET')
-            
-            if response.status_code != 200:
-                return jsonify({
-                    'error': 'Failed to fetch overrides',
-                    'details': response.text
-                }), response.status_code
-            
-            data = response.json()
-            content = base64.b64decode(data['content']).decode('utf-8')
-            content_json = json.loads(content)
+            snapshot = self.overrides_cache.get()
             
-            # 기본값 제공 로직 추가
-            if 'visualization_overrides' in content_json:
-                # referenceLine 기본값 추가
-                if 'referenceLine' not in content_json['visualization_overrides']:
-                    content_json['visualization_overrides']['referenceLine'] = {
-                        'value': 50
-                    }
-                
-                # referenceArea 기본값 추가
-                if 'referenceArea' not in content_json['visualization_overrides']:
-                    content_json['visualization_overrides']['referenceArea'] = {
-                        'min': 45,
-                        'max': 55
-                    }
-                
-                # 색상 키에 referenceLine과 referenceArea 추가
-                if 'colors' in content_json['visualization_overrides']:
-                    if 'referenceLine' not in content_json['visualization_overrides']['colors']:
-                        content_json['visualization_overrides']['colors']['referenceLine'] = {
-                            'r': 1.0, 'g': 0.0, 'b': 0.0, 'a': 1.0
-                        }
-                    if 'referenceArea' not in content_json['visualization_overrides']['colors']:
-                        content_json['visualization_overrides']['colors']['referenceArea'] = {
-                            'r': 1.0, 'g': 0.8, 'b': 0.8, 'a': 0.5
-                        }
-            
-            # 수정된 내용으로 응답 - JSON 문자열로 반환
+            # 기본값이 채워진 내용은 버전마다 한 번만 계산됨 - JSON 문자열로 반환
             return jsonify({
-                'content': json.dumps(content_json, indent=2),
-                'sha': data['sha']
+                'content': snapshot.derived['content'],
+                'sha': snapshot.sha
             })
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch overrides',
+                'details': e.details
+            }), e.status_code
         except Exception as e:
             return jsonify({
                 'error': 'Internal server error',
@@ -313,183 +515,897 @@ class VisualizerApp:
     def update_overrides(self):
         """Update visualization overrides on GitHub"""
         try:
-            print("Received update request")
             data = request.json
-            print(f"Request data: {data}")
             
             if not data.get('content') or not data.get('sha'):
-                print("Missing required fields")
                 return jsonify({
                     'error': 'Missing required fields',
                     'details': 'Both content and sha fields are required'
                 }), 400
             
             # Parse and validate the content
-            print("Parsing content")
-            content_json = json.loads(data['content'])
-            print(f"Parsed content: {json.dumps(content_json, indent=2)[:200]}...")
+            with phase('json_parse'):
+                content_json = json.loads(data['content'])
+            
+            # Validate against the compiled overrides schema (all errors at once)
+            errors = self.validator.validate('visualization_overrides', content_json)
+            if errors:
+                return self._validation_error_response(errors)
+            
+            # Queue the write; bursts of saves are merged into one commit
+            job = self.write_queue.submit(data['content'], data['sha'], data.get('client_id'))
+            log.debug("Queued overrides write", extra={
+                'job_id': job.id, 'base_sha': data['sha'], 'bytes': len(data['content'])
+            })
             
-            if not isinstance(content_json, dict) or 'visualization_overrides' not in content_json:
-                print("Invalid content structure")
+            return self._write_job_response(job)
+        except json.JSONDecodeError as e:
+            return jsonify({
+                'error': 'Invalid JSON content',
+                'details': str(e)
+            }), 400
+        except Exception as e:
+            log.exception("Overrides update failed")
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def patch_overrides(self):
+        """Apply a JSON Patch or merge patch to the overrides
+
+        Accepts `application/json-patch+json` (RFC 6902 operations) or
+        `application/merge-patch+json` (RFC 7386), or a JSON envelope
+        `{"sha", "operations" | "merge_patch", "client_id"}`. The base version
+        comes from If-Match or `sha`; a stale base is only rejected when the
+        keys it writes changed since then.
+        """
+        try:
+            body = request.get_json(force=True, silent=True)
+            if not isinstance(body, (list, dict)):
                 return jsonify({
-                    'error': 'Invalid content structure',
-                    'details': 'Content must contain visualization_overrides object'
+                    'error': 'Invalid patch request',
+                    'details': 'Body must be a JSON array or object'
                 }), 400
+            content_type = request.mimetype
+            base_sha = (request.headers.get('If-Match') or '').strip('"') or None
+            client_id = request.headers.get('X-Client-Id')
             
-            # Validate required fields
-            print("Validating required fields")
-            required_fields = ['colors', 'centroidPosition', 'enabled']
-            for field in required_fields:
-                if field not in content_json['visualization_overrides']:
-                    print(f"Missing required field: {field}")
-                    return jsonify({
-                        'error': 'Missing required field',
-                        'details': f'Field {field} is required'
-                    }), 400
-            
-            # Validate optional fields if present
-            print("Validating optional fields")
-            optional_fields = ['referenceLine', 'referenceArea']
-            for field in optional_fields:
-                if field in content_json['visualization_overrides']:
-                    # 각 필드별 유효성 검사
-                    if field == 'referenceLine':
-                        if not isinstance(content_json['visualization_overrides'][field], dict) or 'value' not in content_json['visualization_overrides'][field]:
-                            print(f"Invalid {field} structure")
-                            return jsonify({
-                                'error': f'Invalid {field} structure',
-                                'details': f'{field} must contain value property'
-                            }), 400
-                    elif field == 'referenceArea':
-                        if not isinstance(content_json['visualization_overrides'][field], dict) or 'min' not in content_json['visualization_overrides'][field] or 'max' not in content_json['visualization_overrides'][field]:
-                            print(f"Invalid {field} structure")
-                            return jsonify({
-                                'error': f'Invalid {field} structure',
-                                'details': f'{field} must contain min and max properties'
-                            }), 400
+            if content_type == 'application/json-patch+json':
+                operations, merge_patch = body, None
+            elif content_type == 'application/merge-patch+json':
+                operations, merge_patch = None, body
+            elif isinstance(body, dict):
+                operations, merge_patch = body.get('operations'), body.get('merge_patch')
+                base_sha = body.get('sha', base_sha)
+                client_id = body.get('client_id', client_id)
+            else:
+                operations, merge_patch = None, None
             
-            # Validate colors structure
-            print("Validating colors structure")
-            colors = content_json['visualization_overrides']['colors']
-            if not isinstance(colors, dict):
-                print("Invalid colors structure")
+            if (operations is None) == (merge_patch is None):
                 return jsonify({
-                    'error': 'Invalid colors structure',
-                    'details': 'colors must be an object'
+                    'error': 'Invalid patch request',
+                    'details': 'Provide either JSON Patch operations or a merge patch'
                 }), 400
             
-            # Validate color components
-            print("Validating color components")
-            for color_key, color_value in colors.items():
-                if color_value is not None:
-                    for component in ['r', 'g', 'b', 'a']:
-                        if component not in color_value or not isinstance(color_value[component], (int, float)):
-                            print(f"Invalid {color_key} structure: missing {component}")
-                            return jsonify({
-                                'error': f'Invalid {color_key} structure',
-                                'details': f'{color_key} must contain numeric {component} value'
-                            }), 400
-            
-            # Validate centroidPosition structure
-            print("Validating centroidPosition structure")
-            pos = content_json['visualization_overrides']['centroidPosition']
-            for coord in ['x', 'y', 'z']:
-                if coord not in pos or not isinstance(pos[coord], (int, float)):
-                    print(f"Invalid centroidPosition structure: missing {coord}")
+            if operations is not None:
+                paths = json_patch_paths(operations)
+                transform = lambda document: apply_json_patch(document, operations)
+            else:
+                if not isinstance(merge_patch, dict):
                     return jsonify({
-                        'error': 'Invalid centroidPosition structure',
-                        'details': f'centroidPosition must contain numeric {coord} value'
+                        'error': 'Invalid patch request',
+                        'details': 'A merge patch must be a JSON object'
                     }), 400
+                paths = merge_patch_paths(merge_patch)
+                transform = lambda document: apply_merge_patch(document, merge_patch)
             
-            # Prepare and send update request
-            print("Preparing update request")
-            payload = {
-                "message": "Update visualization overrides",
-                "content": base64.b64encode(data['content'].encode()).decode(),
-                "sha": data['sha']
-            }
+            current = self.overrides_cache.get()
+            base = current if base_sha in (None, current.sha) else self._overrides_version(base_sha)
+            if base is None:
+                return jsonify({
+                    'error': 'Unknown base version',
+                    'details': f'Version {base_sha} is unknown; reload and retry',
+                    'sha': current.sha
+                }), 409
+            if base is not current and paths_overlap(diff_paths(base.document, current.document), paths):
+                return jsonify({
+                    'error': 'Conflict',
+                    'details': 'The patched keys changed since the base version',
+                    'sha': current.sha
+                }), 409
             
-            print("Sending update request")
-            response = self._github_request('PUT', payload)
+            # Apply to the cached current version and validate only what changed
+            patched = transform(current.document)
+            errors = self.validator.validate_paths('visualization_overrides', patched, paths)
+            if errors:
+                return self._validation_error_response(errors)
             
-            if response.status_code not in [200, 201]:
-                print(f"Error response: {response.status_code} - {response.text}")
-                return jsonify({
-                    'success': False,
-                    'error': f"GitHub API returned status code {response.status_code}",
-                    'details': response.text
-                })
+            job = self.write_queue.submit_patch(
+                transform, paths, base.sha, base.document, client_id
+            )
+            log.debug("Queued overrides patch", extra={'job_id': job.id, 'base_sha': base_sha})
             
-            print("Update successful")
+            return self._write_job_response(job)
+        except JsonPatchTestFailed as e:
             return jsonify({
-                "success": True,
-                "message": "Successfully updated visualization overrides"
-            })
-        except json.JSONDecodeError as e:
-            print(f"JSON decode error: {e}")
+                'error': 'Patch test failed',
+                'details': str(e)
+            }), 409
+        except JsonPatchError as e:
             return jsonify({
-                'error': 'Invalid JSON content',
+                'error': 'Invalid patch',
                 'details': str(e)
             }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch overrides',
+                'details': e.details
+            }), e.status_code
         except Exception as e:
-            print(f"Exception: {e}")
-            import traceback
-            traceback.print_exc()
             return jsonify({
                 'error': 'Internal server error',
                 'details': str(e)
             }), 500
 
+    @staticmethod
+    def _write_job_response(job):
+        """Answer 202 with the job, or wait for it when ?wait=true"""
+        if request.args.get('wait', 'false').lower() == 'true':
+            job.done.wait(float(request.args.get('timeout', '30')))
+            result = job.to_dict()
+            result['success'] = job.status == 'applied'
+            return jsonify(result), 409 if job.status == 'conflict' else 200
+        
+        result = job.to_dict()
+        result['success'] = True
+        result['status_url'] = f"/overrides/jobs/{job.id}"
+        return jsonify(result), 202
+
+    @staticmethod
+    def _validation_error_response(errors):
+        """Build the 400 response listing every schema violation"""
+        first = errors[0]
+        return jsonify({
+            'error': 'Validation failed',
+            'details': f"{first['path'] or '(root)'}: {first['message']}",
+            'errors': errors
+        }), 400
+
+    def validate_all(self):
+        """Validate every JSON file of the repository in one call"""
+        try:
+            snapshot = self.mirror.snapshot if self.mirror else None
+            if snapshot:
+                results = self.validator.validate_files(snapshot.files)
+                source = snapshot.commit
+            else:
+                results = self.validator.validate_tree(self.data_dir)
+                source = str(self.data_dir)
+            
+            return jsonify({
+                'source': source,
+                'valid': all(result['valid'] for result in results.values()),
+                'total_ms': sum(result['ms'] for result in results.values()),
+                'files': results
+            })
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def get_write_job(self, job_id):
+        """Get the status of a queued overrides write"""
+        job = self.write_queue.get(job_id)
+        if job is None:
+            return jsonify({
+                'error': 'Unknown job',
+                'details': f'No write job with id {job_id}'
+            }), 404
+        return jsonify(job.to_dict())
+
+    def _ensure_feed_started(self):
+        """Make sure the feed holds the current version before clients wait on it"""
+        if self.change_feed.cursor == 0:
+            self.overrides_cache.get()
+
+    def _feed_full_response(self):
+        response = jsonify({
+            'error': 'Too many change feed subscribers',
+            'details': f'At most {self.feed_max_subscribers} devices can wait on the change feed'
+        })
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    def get_overrides_changes(self):
+        """Long-poll for overrides changes after a cursor"""
+        try:
+            self._ensure_feed_started()
+            since = request.args.get('since', type=int)
+            timeout = min(request.args.get('timeout', 25.0, type=float), 60.0)
+            if not self._feed_slots.acquire(blocking=False):
+                return self._feed_full_response()
+            try:
+                events = self.change_feed.wait(since, timeout)
+            finally:
+                self._feed_slots.release()
+            return jsonify({
+                'cursor': events[-1]['cursor'] if events else since,
+                'events': events
+            })
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch overrides',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def stream_overrides(self):
+        """Server-Sent Events stream of overrides changes"""
+        try:
+            self._ensure_feed_started()
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch overrides',
+                'details': e.details
+            }), e.status_code
+        
+        since = request.headers.get('Last-Event-ID', type=int)
+        if since is None:
+            since = request.args.get('since', type=int)
+        if not self._feed_slots.acquire(blocking=False):
+            return self._feed_full_response()
+        
+        def generate(since):
+            # Retry hint for reconnecting clients, then one event per version
+            yield "retry: 2000\n\n"
+            while True:
+                events = self.change_feed.wait(since, timeout=15.0)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for event in events:
+                    since = event['cursor']
+                    yield f"id: {since}\nevent: overrides\ndata: {json.dumps(event)}\n\n"
+        
+        response = Response(
+            stream_with_context(generate(since)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+        )
+        # The server closes the response when the client goes away
+        response.call_on_close(self._feed_slots.release)
+        return response
+
     def get_color_keys(self):
         """Get available color keys from visualization overrides"""
         try:
-            # First try to get from GitHub
-            response = self._github_request('GET')
+            snapshot = self.overrides_cache.get()
+            color_keys = snapshot.derived['color_keys']
             
-            if response.status_code != 200:
+            if color_keys is None:
                 return jsonify({
-                    'error': 'Failed to fetch overrides from GitHub',
-                    'details': response.text
-                }), response.status_code
+                    'error': 'Invalid JSON structure',
+                    'details': 'visualization_overrides.colors not found in JSON'
+                }), 400
             
-            data = response.json()
-            content = base64.b64decode(data['content']).decode('utf-8')
-            content_json = json.loads(content)
+            return jsonify({
+                'color_keys': color_keys
+            })
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch overrides from GitHub',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def get_device_bundle(self, device_id):
+        """Get every file a device needs at boot in one compressed response"""
+        try:
+            bundle = self.device_bundles.get(device_id)
+            return self._compressed_response(bundle.etag, bundle.body, bundle.gzip_body)
+        except DeviceNotFound:
+            return jsonify({
+                'error': 'Unknown device',
+                'details': f'{device_id} is not listed in startup.json'
+            }), 404
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch configuration files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    @staticmethod
+    def _compressed_response(etag, body, gzip_body):
+        """JSON response with an ETag (304 on match), gzip-encoded when accepted"""
+        etag = f'"{etag}"'
+        if etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers={'ETag': etag})
+        
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            body = gzip_body
+        return Response(body, mimetype='application/json', headers=headers)
+
+    def get_manifest(self):
+        """Get path, sha256, size and version of every tracked file"""
+        try:
+            manifest = self.manifest.current()
+            return self._compressed_response(manifest.hash, manifest.body, manifest.gzip_body)
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to list repository files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def sync_files(self):
+        """Get only the files changed since a manifest hash, compressed
+
+        GET takes the client's last manifest hash as ?since= or If-None-Match
+        (304 when nothing changed); POST takes the client's own
+        `{"files": {path: sha256}}` when the server no longer knows its hash.
+        """
+        try:
+            client_hashes = None
+            since = request.args.get('since') or request.headers.get('If-None-Match', '').strip('"') or None
+            if request.method == 'POST':
+                client_hashes = (request.get_json(silent=True) or {}).get('files')
+                if not isinstance(client_hashes, dict):
+                    raise ValueError('files must be an object of path -> sha256')
+                since = None
             
-            if 'visualization_overrides' in content_json and 'colors' in content_json['visualization_overrides']:
-                # Get color keys from GitHub
-                github_color_keys = list(content_json['visualization_overrides']['colors'].keys())
-                
-                # 필수 색상 키 목록
-                required_color_keys = ['barForeground', 'referenceLine', 'referenceArea']
-                
-                # 필수 키가 없으면 추가
-                for key in required_color_keys:
-                    if key not in github_color_keys:
-                        github_color_keys.append(key)
-                
+            manifest = self.manifest.current()
+            if since == manifest.hash:
+                return Response(status=304, headers={'ETag': f'"{manifest.hash}"'})
+            delta = self.manifest.delta(since, client_hashes)
+            log.info("Sync", extra={
+                'base': delta.base, 'manifest': delta.manifest, 'full': delta.full,
+                'changed': len(delta.changed), 'deleted': len(delta.deleted)
+            })
+            # The ETag is the new manifest hash; it is also the next ?since=
+            return self._compressed_response(delta.manifest, delta.body, delta.gzip_body)
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch repository files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def get_tf_frames(self):
+        """List every frame of the TF graph"""
+        try:
+            return jsonify({'frames': self.frame_graph.graph().frames()})
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch TF files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def update_tf_frame(self, frame_id):
+        """Move a dynamic frame (kept in memory until its file changes)"""
+        try:
+            data = request.get_json(silent=True) or {}
+            pose = data.get('pose')
+            if not isinstance(pose, dict):
                 return jsonify({
-                    'color_keys': github_color_keys
-                })
-            else:
+                    'error': 'Invalid request',
+                    'details': 'Body must contain a pose object'
+                }), 400
+            self.frame_graph.update_frame(frame_id, Transform.from_pose(pose, rhcs=data.get('RHCS', True)))
+            return jsonify({'success': True, 'frame_id': frame_id})
+        except FrameError as e:
+            return jsonify({
+                'error': 'Unknown frame',
+                'details': str(e)
+            }), 404
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch TF files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def lookup_tf(self):
+        """Get the transform mapping coordinates in `source` into `target`"""
+        source = request.args.get('source')
+        target = request.args.get('target')
+        if not source or not target:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': 'source and target query parameters are required'
+            }), 400
+        try:
+            transform = self.frame_graph.graph().lookup(source, target)
+            return jsonify({'source': source, 'target': target, **transform.to_dict()})
+        except FrameError as e:
+            return jsonify({
+                'error': 'Unknown frame',
+                'details': str(e)
+            }), 404
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch TF files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def transform_tf(self):
+        """Transform a batch of points and/or poses from `source` into `target`"""
+        data = request.get_json(silent=True) or {}
+        source = data.get('source')
+        target = data.get('target')
+        if not source or not target:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': 'source and target are required'
+            }), 400
+        try:
+            graph = self.frame_graph.graph()
+            result = {'source': source, 'target': target}
+            if data.get('points'):
+                result['points'] = graph.transform_points(data['points'], source, target).tolist()
+            if data.get('poses'):
+                poses = data['poses']
+                positions = [[p.get('x', 0.0), p.get('y', 0.0), p.get('z', 0.0)] for p in poses]
+                quaternions = [[p.get('qx', 0.0), p.get('qy', 0.0), p.get('qz', 0.0), p.get('qw', 1.0)] for p in poses]
+                positions, quaternions = graph.transform_poses(positions, quaternions, source, target)
+                result['poses'] = [
+                    dict(zip(('x', 'y', 'z', 'qx', 'qy', 'qz', 'qw'), position + quaternion))
+                    for position, quaternion in zip(positions.tolist(), quaternions.tolist())
+                ]
+            return jsonify(result)
+        except FrameError as e:
+            return jsonify({
+                'error': 'Unknown frame',
+                'details': str(e)
+            }), 404
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch TF files',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def _task_table(self):
+        """Load the task CSV (?path= or startup.json task_information_path)"""
+        path = request.args.get('path')
+        if not path:
+            startup = json.loads(self.repo_files.read('startup.json').text)
+            path = startup.get('ros_info', {}).get('task_information_path')
+        if not path or not path.endswith('.csv'):
+            raise ValueError('A task CSV path is required')
+        return path, self.task_tables.load(self.repo_files.read(path).text, name=path)
+
+    def get_tasks(self):
+        """Summarize the task table"""
+        try:
+            path, table = self._task_table()
+            return jsonify({
+                'path': path,
+                'version': table.digest,
+                'rows': len(table),
+                'experiments': table.experiments
+            })
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch task file',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def get_task_experiment(self, exp):
+        """Get the final offset target poses of every sub-experiment of `exp`"""
+        try:
+            path, table = self._task_table()
+            return jsonify({'path': path, 'version': table.digest, **table.experiment_dict(exp)})
+        except KeyError:
+            return jsonify({
+                'error': 'Unknown experiment',
+                'details': f'Experiment {exp} is not in the task table'
+            }), 404
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch task file',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def get_feasibility(self):
+        """Get the feasibility report of a task CSV (?path=, default task_information_path)"""
+        try:
+            return jsonify(self.feasibility.check(request.args.get('path')))
+        except (KeyError, ValueError) as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch feasibility inputs',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def check_feasibility(self):
+        """Check ad-hoc target and/or joint arrays against params.yaml"""
+        data = request.get_json(silent=True) or {}
+        try:
+            checker = self.feasibility.checker()
+            result = {}
+            for key, mask in (
+                ('targets', checker.check_targets(
+                    data['targets'], data.get('frame', 'ft'), float(data.get('scale', 1.0))
+                ) if data.get('targets') else None),
+                ('joints', checker.check_joints(
+                    data['joints'], data.get('dt')
+                ) if data.get('joints') else None)
+            ):
+                if mask is None:
+                    continue
+                result[key] = {
+                    **summarize(mask),
+                    'mask': mask.tolist(),
+                    'infeasible_items': [
+                        {'index': int(i), 'violations': violation_names(int(mask[i]))}
+                        for i in mask.nonzero()[0]
+                    ]
+                }
+            if not result:
                 return jsonify({
-                    'error': 'Invalid JSON structure',
-                    'details': 'visualization_overrides.colors not found in JSON'
+                    'error': 'Invalid request',
+                    'details': 'Provide targets and/or joints'
                 }), 400
+            return jsonify(result)
+        except (KeyError, ValueError, TypeError) as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch feasibility inputs',
+                'details': e.details
+            }), e.status_code
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    def get_telemetry(self):
+        """Get the telemetry publisher status and the config it streams with"""
+        try:
+            if self.telemetry:
+                return jsonify({'enabled': True, **self.telemetry.status()})
+            return jsonify({'enabled': False, 'config': self.telemetry_config.config().to_dict()})
+        except UpstreamError as e:
+            return jsonify({
+                'error': 'Failed to fetch telemetry config',
+                'details': e.details
+            }), e.status_code
         except Exception as e:
             return jsonify({
                 'error': 'Internal server error',
                 'details': str(e)
             }), 500
 
+    def push_telemetry_samples(self):
+        """Queue step-length samples for publishing ({"t", "left", "right"} or a list)"""
+        if not self.telemetry:
+            return jsonify({
+                'error': 'Telemetry not available',
+                'details': 'Set TELEMETRY_ENABLED=true'
+            }), 400
+        data = request.get_json(silent=True)
+        try:
+            samples = parse_samples(data)
+            status = self.telemetry.status()
+            if status['endpoint'] is None:
+                # Another process owns the port (or it is not bound yet): nothing would publish these
+                response = jsonify({
+                    'error': 'Telemetry not publishing',
+                    'details': status['error'] or 'The PUB port is not bound by this process'
+                })
+                response.headers['Retry-After'] = '1'
+                return response, 503
+            self.telemetry.push_many(*samples.T)
+            return jsonify({'queued': len(samples)}), 202
+        except (KeyError, ValueError, TypeError) as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+
+    def _history_error_response(self, e):
+        if isinstance(e, HistoryError):
+            return jsonify({
+                'error': 'History lookup failed',
+                'details': e.details
+            }), e.status_code
+        if isinstance(e, (KeyError, ValueError)):
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        return jsonify({
+            'error': 'Internal server error',
+            'details': str(e)
+        }), 500
+
+    def _require_history(self):
+        if not self.history:
+            raise HistoryError(400, 'History needs the deploy-key mirror (USE_DEPLOY_KEY=true)')
+
+    def get_history_paths(self):
+        """List every tracked file with its number of versions"""
+        try:
+            self._require_history()
+            files = self.history.paths()
+            return jsonify({'head': self.history.head, 'files': files})
+        except Exception as e:
+            return self._history_error_response(e)
+
+    def get_history_versions(self):
+        """List the commits that changed ?path= (newest first, ?limit=)"""
+        try:
+            self._require_history()
+            path = request.args['path']
+            limit = int(request.args['limit']) if request.args.get('limit') else None
+            return jsonify({
+                'path': path,
+                'versions': [entry.to_dict() for entry in self.history.versions(path, limit)]
+            })
+        except Exception as e:
+            return self._history_error_response(e)
+
+    def get_history_file(self):
+        """Get ?path= as of ?version= (commit sha or ref, default HEAD)"""
+        try:
+            self._require_history()
+            path = request.args['path']
+            commit, raw = self.history.content(path, request.args.get('version', 'HEAD'))
+            if raw is None:
+                raise HistoryError(404, f"{path} does not exist at {commit}")
+            result = {'path': path, 'commit': commit, 'content': raw.decode('utf-8')}
+            if path.lower().endswith(('.json', '.yaml', '.yml')):
+                result['document'] = parse_document(path, raw)
+            return jsonify(result)
+        except Exception as e:
+            return self._history_error_response(e)
+
+    def get_history_diff(self):
+        """Diff ?path= between ?from= and ?to= (default HEAD)"""
+        try:
+            self._require_history()
+            return jsonify(self.history.diff(
+                request.args['path'], request.args['from'], request.args.get('to', 'HEAD')
+            ))
+        except Exception as e:
+            return self._history_error_response(e)
+
+    def rollback_history(self):
+        """Restore one file to an earlier version in a single commit"""
+        data = request.get_json(silent=True) or {}
+        try:
+            self._require_history()
+            path = data['path']
+            commit, raw = self.history.content(path, data['version'])
+            changes = normalize_changes({path: raw.decode('utf-8') if raw is not None else None})
+        except Exception as e:
+            return self._history_error_response(e)
+        message = data.get('message') or f"Roll back {path} to {commit[:7]}"
+        return self._commit_files(changes, message, data.get('base_commit'), restored_from=commit)
+
+    def batch_update_files(self):
+        """Write several repository files as one commit"""
+        try:
+            data = request.get_json(silent=True) or {}
+            changes = {
+                path: json.dumps(content, indent=2) if isinstance(content, (dict, list)) else content
+                for path, content in (data.get('changes') or {}).items()
+            }
+            changes = normalize_changes(changes)
+        except (ValueError, AttributeError) as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        
+        message = data.get('message') or f"Update {len(changes)} configuration files"
+        return self._commit_files(changes, message, data.get('base_commit'))
+
+    def _commit_files(self, changes, message, base_commit=None, **extra):
+        """Validate and commit normalized changes, returning the Flask response"""
+        # Validate every written file before anything is committed
+        errors = []
+        written = {path: content for path, content in changes.items() if content is not None}
+        for path, result in self.validator.validate_files(written).items():
+            errors.extend(
+                {'path': f"{path}:{error['path']}", 'message': error['message']}
+                for error in result['errors']
+            )
+        for path, content in written.items():
+            if path.endswith(('.yaml', '.yml')):
+                try:
+                    yaml.safe_load(content)
+                except yaml.YAMLError as e:
+                    errors.append({'path': f"{path}:", 'message': f'Invalid YAML: {e}'})
+        if errors:
+            return self._validation_error_response(errors)
+        
+        try:
+            if self.mirror_committer:
+                commit = self.mirror_committer.commit(changes, message, base_commit)
+            else:
+                if not self.github_token:
+                    raise ValueError("GitHub token required for batch writes")
+                commit = self.trees_committer.commit(changes, message, base_commit)
+                self.repo_files.invalidate()
+                self.overrides_cache.invalidate()
+                if self.overrides_path in changes:
+                    # Publish the new overrides to the change feed right away
+                    self.overrides_cache.get(max_age=0)
+                # The mirror listener does this in deploy-key mode
+                threading.Thread(target=self._check_feasibility, args=(set(changes),), daemon=True).start()
+            log.info("Committed batch", extra={'commit': commit, 'files': sorted(changes)})
+            return jsonify({
+                'success': True,
+                'commit': commit,
+                'files': sorted(changes),
+                **extra
+            })
+        except WriteConflict as e:
+            return jsonify({
+                'error': 'Conflict',
+                'details': str(e)
+            }), 409
+        except BatchCommitError as e:
+            return jsonify({
+                'error': 'Failed to commit files',
+                'details': e.details
+            }), e.status_code if e.status_code >= 400 else 502
+        except ValueError as e:
+            return jsonify({
+                'error': 'Invalid request',
+                'details': str(e)
+            }), 400
+        except Exception as e:
+            return jsonify({
+                'error': 'Internal server error',
+                'details': str(e)
+            }), 500
+
+    @staticmethod
+    def _start_timer():
+        g.request_started = time.perf_counter()
+
+    @staticmethod
+    def _record_request(response):
+        started = getattr(g, 'request_started', None)
+        if started is not None:
+            HTTP_REQUESTS.observe(
+                time.perf_counter() - started,
+                endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+                method=request.method,
+                status=response.status_code
+            )
+        return response
+
+    def _retry_while_cloning(self, response):
+        """Tell clients when to come back while the first clone is running"""
+        if response.status_code == 503 and self.mirror and not self.mirror.ready:
+            response.headers['Retry-After'] = '1'
+        return response
+
+    def get_metrics(self):
+        """Expose counters and latency histograms in Prometheus text format"""
+        return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+    def sync_mirror(self):
+        """Trigger an immediate deploy-key mirror sync and wait for it"""
+        if not self.mirror:
+            return jsonify({
+                'error': 'Mirror not available',
+                'details': 'Deploy key mode is not active'
+            }), 400
+        
+        snapshot = self.mirror.request_sync(wait=True)
+        return jsonify({
+            'success': self.mirror.last_error is None,
+            'commit': snapshot.commit if snapshot else None,
+            'synced_at': snapshot.synced_at if snapshot else None,
+            'error': self.mirror.last_error
+        })
+
     def serve_static(self, filename):
         """Serve static files"""
         return send_from_directory(self.app.static_folder, filename)
 
-    def run(self, debug=True, port=5000):
-        """Run application"""
-        self.app.run(debug=debug, port=port)
+    def run(self, debug=False, port=5000):
+        """Run the Flask development server (see wsgi.py for production)"""
+        # The reloader would start a second process with its own clone
+        self.app.run(debug=debug, port=port, use_reloader=False, threaded=True)
+
 
 if __name__ == '__main__':
     app = VisualizerApp()
-    app.run(debug=True, port=5000)
+    app.run(debug=os.environ.get('FLASK_DEBUG', 'false').lower() == 'true',
+            port=int(os.environ.get('PORT', '5000')))
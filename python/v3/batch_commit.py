@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""Land a set of path -> content changes as a single commit"""
+import logging
+import os
+import posixpath
+import subprocess
+
+from instrumentation import phase
+from write_queue import WriteConflict
+
+log = logging.getLogger(__name__)
+
+
+class BatchCommitError(Exception):
+    """Raised when the upstream commit could not be created"""
+
+    def __init__(self, status_code, details):
+        super().__init__(details)
+        self.status_code = status_code
+        self.details = details
+
+
+def normalize_changes(changes):
+    """Check repository paths of a change set (content None deletes a file)"""
+    if not isinstance(changes, dict) or not changes:
+        raise ValueError('changes must be a non-empty object of path -> content')
+    normalized = {}
+    for path, content in changes.items():
+        clean = posixpath.normpath(path)
+        parts = clean.split('/')
+        # Compare whole components so .github/ and .gitignore stay writable
+        if (path.startswith('/') or clean == '.' or parts[0] == '..'
+                or any(part.lower() == '.git' for part in parts)):
+            raise ValueError(f"Invalid repository path: {path}")
+        if content is not None and not isinstance(content, str):
+            raise ValueError(f"Content of {path} must be a string or null")
+        normalized[clean] = content
+    return normalized
+
+
+class GitTreesCommitter:
+    """One commit through the git data API: tree, commit, then ref update
+
+    The ref update is not forced, so a concurrent push makes it fail with
+    422 instead of being overwritten; that is reported as a WriteConflict.
+    """
+
+    def __init__(self, github, owner, repo, branch='master'):
+        self.github = github
+        self.base = f"/repos/{owner}/{repo}/git"
+        self.branch = branch
+
+    def commit(self, changes, message, base_commit=None):
+        """Create the commit and return its sha"""
+        ref = self._json(self.github.get(f"{self.base}/ref/heads/{self.branch}"))
+        head = ref['object']['sha']
+        if base_commit and base_commit != head:
+            raise WriteConflict(f"Branch moved from {base_commit} to {head}. Reload and retry.")
+        head_commit = self._json(self.github.get(f"{self.base}/commits/{head}"))
+
+        tree = [
+            {'path': path, 'mode': '100644', 'type': 'blob', 'content': content}
+            if content is not None else
+            {'path': path, 'mode': '100644', 'type': 'blob', 'sha': None}
+            for path, content in changes.items()
+        ]
+        new_tree = self._json(self.github.post(
+            f"{self.base}/trees",
+            json={'base_tree': head_commit['tree']['sha'], 'tree': tree}
+        ))
+        if new_tree['sha'] == head_commit['tree']['sha']:
+            return head
+
+        new_commit = self._json(self.github.post(
+            f"{self.base}/commits",
+            json={'message': message, 'tree': new_tree['sha'], 'parents': [head]}
+        ))
+        response = self.github.patch(
+            f"{self.base}/refs/heads/{self.branch}",
+            json={'sha': new_commit['sha'], 'force': False}
+        )
+        if response.status_code == 422:
+            raise WriteConflict(f"{self.branch} moved during the commit. Reload and retry.")
+        self._json(response)
+        return new_commit['sha']
+
+    @staticmethod
+    def _json(response):
+        if response.status_code not in (200, 201):
+            raise BatchCommitError(response.status_code, response.text)
+        return response.json()
+
+
+class MirrorCommitter:
+    """One local commit and push in the deploy-key mirror clone
+
+    Runs under the mirror lock so background syncs never see a half-written
+    working tree; a rejected push is rolled back so the clone can keep
+    fast-forwarding.
+    """
+
+    def __init__(self, mirror, branch='master'):
+        self.mirror = mirror
+        self.branch = branch
+
+    def commit(self, changes, message, base_commit=None, fetch=True):
+        """Create, push and publish the commit, returning its sha"""
+        with self.mirror.lock:
+            if fetch:
+                self.mirror.sync()
+            head_before = self._git('rev-parse', 'HEAD').strip()
+            if base_commit and base_commit != head_before:
+                raise WriteConflict(f"Branch moved from {base_commit} to {head_before}. Reload and retry.")
+
+            try:
+                for path, content in changes.items():
+                    file_path = os.path.join(self.mirror.repo_dir, path)
+                    # --sparse: the mirror only checks out the file types it serves
+                    if content is None:
+                        self._git('rm', '-q', '--sparse', '--ignore-unmatch', '--', path)
+                        continue
+                    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+                    with open(file_path, 'w') as f:
+                        f.write(content)
+                    self._git('add', '--sparse', '--', path)
+
+                with phase('git_diff'):
+                    unchanged = subprocess.run(
+                        ["git", "diff", "--cached", "--quiet"],
+                        cwd=self.mirror.repo_dir,
+                        capture_output=True
+                    ).returncode == 0
+                if unchanged:
+                    log.info("Content unchanged, skipping commit", extra={'commit': head_before})
+                    return head_before
+
+                self._git('commit', '-m', message)
+                with phase('git_push'):
+                    push_result = subprocess.run(
+                        ["git", "push", "origin", self.branch],
+                        cwd=self.mirror.repo_dir,
+                        capture_output=True
+                    )
+                if push_result.returncode != 0:
+                    raise BatchCommitError(500, f"Git push failed: {push_result.stderr.decode()}")
+            except Exception:
+                # Drop the partial or unpushed commit
+                subprocess.run(
+                    ["git", "reset", "--hard", head_before],
+                    cwd=self.mirror.repo_dir,
+                    capture_output=True
+                )
+                raise
+
+            return self.mirror.refresh().commit
+
+    def _git(self, *args):
+        try:
+            with phase(f'git_{args[0]}'):
+                return subprocess.run(
+                    ["git", *args],
+                    cwd=self.mirror.repo_dir,
+                    check=True,
+                    capture_output=True
+                ).stdout.decode()
+        except subprocess.CalledProcessError as e:
+            raise BatchCommitError(500, e.stderr.decode(errors='replace')) from e
@@ -0,0 +1,395 @@
+#!/usr/bin/env python
+"""Load-test VisualizerApp against local GitHub and git-remote stand-ins
+
+Runs concurrent readers (GET /overrides, GET /color-keys), editors
+(GET then POST /overrides) and reconnecting devices (GET /sync?since=)
+against the app in each backend mode:
+
+- api:    contents API served by an in-process fake of api.github.com
+- deploy: deploy-key mirror cloned from a local bare repository
+
+Results (throughput and p50/p95/p99 latency per mode and endpoint) are
+printed and saved as JSON; pass an earlier result file to --compare to see
+regressions.
+
+Usage:
+    python benchmarks/bench_load.py [--modes api deploy] [--readers 8] [--writers 2] [--syncers 4]
+                                    [--duration 10] [--output results.json]
+                                    [--compare baseline.json]
+"""
+import argparse
+import base64
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import unquote
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import app2  # noqa: E402
+
+DATA_DIR = Path(__file__).resolve().parents[3] / 'data'
+OWNER = 'bench'
+REPO = 'AR_info_data'
+PERCENTILES = (50, 95, 99)
+
+
+def blob_sha(content):
+    return hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest()
+
+
+class FakeGitHub:
+    """In-memory contents API (conditional GET, sha-checked PUT) and recursive trees listing"""
+
+    def __init__(self, data_dir, latency=0.0):
+        self.latency = latency
+        self.files = {
+            path.relative_to(data_dir).as_posix(): path.read_bytes()
+            for path in data_dir.rglob('*') if path.is_file()
+        }
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        fake = self
+        prefix = f"/repos/{OWNER}/{REPO}/contents/"
+        trees_prefix = f"/repos/{OWNER}/{REPO}/git/trees/"
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith(trees_prefix):
+                    return self._tree()
+                path = self._path()
+                with fake.lock:
+                    fake.requests += 1
+                    content = fake.files.get(path)
+                if content is None:
+                    return self._reply(404, {'message': 'Not Found'})
+                sha = blob_sha(content)
+                etag = f'"{sha}"'
+                if self.headers.get('If-None-Match') == etag:
+                    return self._reply(304, None, {'ETag': etag})
+                self._reply(200, {
+                    'path': path,
+                    'sha': sha,
+                    'encoding': 'base64',
+                    'content': base64.b64encode(content).decode()
+                }, {'ETag': etag})
+
+            def do_PUT(self):
+                path = self._path()
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                content = base64.b64decode(body['content'])
+                with fake.lock:
+                    fake.requests += 1
+                    current = fake.files.get(path)
+                    if current is not None and body.get('sha') != blob_sha(current):
+                        return self._reply(409, {'message': f'{path} does not match {body.get("sha")}'})
+                    fake.files[path] = content
+                self._reply(200, {'content': {'path': path, 'sha': blob_sha(content)}})
+
+            def _tree(self):
+                time.sleep(fake.latency)
+                with fake.lock:
+                    fake.requests += 1
+                    tree = [
+                        {'path': path, 'type': 'blob', 'sha': blob_sha(content), 'size': len(content)}
+                        for path, content in sorted(fake.files.items())
+                    ]
+                etag = '"%s"' % hashlib.sha1(json.dumps(tree).encode()).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    return self._reply(304, None, {'ETag': etag})
+                self._reply(200, {'tree': tree, 'truncated': False}, {'ETag': etag})
+
+            def _path(self):
+                time.sleep(fake.latency)
+                return unquote(self.path.split('?', 1)[0][len(prefix):])
+
+            def _reply(self, status, payload, headers=None):
+                body = json.dumps(payload).encode() if payload is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
+
+
+def make_bare_remote(data_dir, root):
+    """Create a bare repo whose master holds a copy of the data tree"""
+    remote = Path(root) / 'remote.git'
+    seed = Path(root) / 'seed'
+    subprocess.run(['git', 'init', '-q', '--bare', '-b', 'master', str(remote)], check=True)
+    # Let the app make its blob-filtered partial clone, as GitHub does
+    subprocess.run(['git', 'config', 'uploadpack.allowFilter', 'true'], cwd=remote, check=True)
+    shutil.copytree(data_dir, seed)
+    for args in (['init', '-q', '-b', 'master'], ['add', '-A'],
+                 ['commit', '-q', '-m', 'Seed benchmark data'],
+                 ['push', '-q', str(remote), 'master']):
+        subprocess.run(['git', *args], cwd=seed, check=True)
+    return remote
+
+
+def make_app(mode, fake=None, remote=None):
+    """Build a VisualizerApp for one backend mode"""
+    os.environ.update({
+        'GITHUB_OWNER': OWNER,
+        'GITHUB_REPO': REPO,
+        'GITHUB_TOKEN': 'bench-token',
+        'USE_DEPLOY_KEY': 'true' if mode == 'deploy' else 'false',
+        'DEPLOY_KEY_PATH': '/dev/null' if mode == 'deploy' else ''
+    })
+    if fake is not None:
+        os.environ['GITHUB_API_URL'] = fake.url
+    if remote is not None:
+        # file:// so git honours --depth and --filter like it would for GitHub
+        os.environ['GIT_REMOTE_URL'] = Path(remote).resolve().as_uri()
+        os.environ['MIRROR_DIR'] = str(Path(remote).parent / 'mirror')
+
+    app = app2.VisualizerApp()
+    if app.mirror is not None and not app.mirror.wait_ready(timeout=60):
+        raise RuntimeError(f"Mirror clone did not finish: {app.mirror.last_error}")
+    return app
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.bytes = {}
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, elapsed, ok, size=0):
+        with self.lock:
+            self.samples.setdefault(endpoint, []).append(elapsed)
+            self.bytes[endpoint] = self.bytes.get(endpoint, 0) + size
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, duration):
+        results = {}
+        for endpoint, samples in sorted(self.samples.items()):
+            samples = sorted(samples)
+            results[endpoint] = {
+                'requests': len(samples),
+                'errors': self.errors.get(endpoint, 0),
+                'rps': len(samples) / duration,
+                'avg_bytes': self.bytes.get(endpoint, 0) / len(samples),
+                **{
+                    f'p{q}_ms': samples[int(q / 100 * (len(samples) - 1))] * 1000.0
+                    for q in PERCENTILES
+                }
+            }
+        return results
+
+
+def timed(recorder, endpoint, call):
+    started = time.perf_counter()
+    try:
+        response = call()
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    # Bytes on the wire (compressed when the response was gzip-encoded)
+    size = int(response.headers.get('Content-Length', 0)) if response is not None else 0
+    recorder.record(endpoint, time.perf_counter() - started, ok, size)
+    return response if ok else None
+
+
+def reader(base_url, deadline, recorder):
+    session = requests.Session()
+    while time.monotonic() < deadline:
+        timed(recorder, 'GET /overrides', lambda: session.get(f"{base_url}/overrides"))
+        timed(recorder, 'GET /color-keys', lambda: session.get(f"{base_url}/color-keys"))
+
+
+def syncer(base_url, deadline, recorder, interval):
+    """A device that reconnects every `interval` s and syncs from its last manifest"""
+    session = requests.Session()
+    since = None
+    while time.monotonic() < deadline:
+        response = timed(recorder, 'GET /sync', lambda: session.get(
+            f"{base_url}/sync", params={'since': since} if since else None
+        ))
+        if response is not None and response.status_code == 200:
+            since = response.json()['manifest']
+        time.sleep(interval)
+
+
+def editor(base_url, deadline, recorder, wait, think):
+    session = requests.Session()
+    client_id = f"bench-{threading.get_ident()}"
+    suffix = '?wait=true' if wait else ''
+    while time.monotonic() < deadline:
+        response = timed(recorder, 'GET /overrides', lambda: session.get(f"{base_url}/overrides"))
+        if response is None:
+            continue
+        current = response.json()
+        document = json.loads(current['content'])
+        colors = document['visualization_overrides']['colors']
+        key = random.choice([k for k, v in colors.items() if v])
+        colors[key]['a'] = round(random.random(), 3)
+        payload = {'content': json.dumps(document, indent=2), 'sha': current['sha'], 'client_id': client_id}
+        timed(recorder, 'POST /overrides', lambda: session.post(f"{base_url}/overrides{suffix}", json=payload))
+        time.sleep(think)
+
+
+def run_mode(mode, args, workdir):
+    fake = FakeGitHub(DATA_DIR, latency=args.upstream_latency / 1000.0).start() if mode == 'api' else None
+    remote = make_bare_remote(DATA_DIR, Path(workdir) / mode) if mode == 'deploy' else None
+    log = io.StringIO()
+    with contextlib.redirect_stdout(sys.stdout if args.verbose else log):
+        app = make_app(mode, fake, remote)
+        server = make_server('127.0.0.1', 0, app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+        # Warm the caches so the first sample is not a cold clone/fetch
+        requests.get(f"{base_url}/overrides").raise_for_status()
+
+        recorder = Recorder()
+        started = time.monotonic()
+        deadline = started + args.duration
+        workers = [
+            threading.Thread(target=reader, args=(base_url, deadline, recorder))
+            for _ in range(args.readers)
+        ] + [
+            threading.Thread(target=editor, args=(base_url, deadline, recorder, args.wait_writes, args.think))
+            for _ in range(args.writers)
+        ] + [
+            threading.Thread(target=syncer, args=(base_url, deadline, recorder, args.sync_interval))
+            for _ in range(args.syncers)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.monotonic() - started
+
+        # Let queued writes land before the remote is torn down
+        app.write_queue.wait_idle(timeout=30)
+        server.shutdown()
+        if app.mirror:
+            app.mirror.stop()
+        if fake:
+            fake.stop()
+    return {
+        'duration_s': elapsed,
+        'upstream_requests': fake.requests if fake else None,
+        'endpoints': recorder.summary(elapsed)
+    }
+
+
+def print_results(results, baseline=None):
+    header = f"{'mode':7} {'endpoint':18} {'reqs':>7} {'err':>5} {'rps':>8} {'avg B':>8}" + ''.join(
+        f" {f'p{q} ms':>9}" for q in PERCENTILES
+    )
+    print(header)
+    for mode, result in results['modes'].items():
+        for endpoint, stats in result['endpoints'].items():
+            line = (f"{mode:7} {endpoint:18} {stats['requests']:7d} {stats['errors']:5d} {stats['rps']:8.1f}"
+                    f" {stats.get('avg_bytes', 0):8.0f}")
+            line += ''.join(f" {stats[f'p{q}_ms']:9.2f}" for q in PERCENTILES)
+            base = (baseline or {}).get('modes', {}).get(mode, {}).get('endpoints', {}).get(endpoint)
+            if base:
+                line += f"   rps {_delta(stats['rps'], base['rps'])}  p95 {_delta(stats['p95_ms'], base['p95_ms'])}"
+            print(line)
+
+
+def _delta(value, base):
+    return f"{(value - base) / base * 100:+6.1f}%" if base else '   n/a'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--modes', nargs='+', choices=['api', 'deploy'], default=['api', 'deploy'])
+    parser.add_argument('--readers', type=int, default=8, help='concurrent device/reader clients')
+    parser.add_argument('--writers', type=int, default=2, help='concurrent editors')
+    parser.add_argument('--syncers', type=int, default=4, help='devices polling GET /sync?since=')
+    parser.add_argument('--sync-interval', type=float, default=0.1, help='device pause between syncs (s)')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per mode')
+    parser.add_argument('--think', type=float, default=0.05, help='editor pause between saves (s)')
+    parser.add_argument('--wait-writes', action='store_true', help='POST with ?wait=true (end-to-end write latency)')
+    parser.add_argument('--upstream-latency', type=float, default=0.0, help='fake GitHub latency per request (ms)')
+    parser.add_argument('--output', help='result JSON path (default: benchmarks/results/load-<time>.json)')
+    parser.add_argument('--compare', help='earlier result JSON to diff against')
+    parser.add_argument('--verbose', action='store_true', help='show app logs')
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('GIT_AUTHOR_NAME', 'bench')
+    os.environ.setdefault('GIT_AUTHOR_EMAIL', 'bench@localhost')
+    os.environ.setdefault('GIT_COMMITTER_NAME', 'bench')
+    os.environ.setdefault('GIT_COMMITTER_EMAIL', 'bench@localhost')
+
+    results = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=Path(__file__).parent, capture_output=True
+        ).stdout.decode().strip() or None,
+        'python': platform.python_version(),
+        'params': {
+            key: getattr(args, key)
+            for key in ('readers', 'writers', 'syncers', 'sync_interval', 'duration', 'think', 'wait_writes',
+                        'upstream_latency')
+        },
+        'modes': {}
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        for mode in args.modes:
+            print(f"Running {mode} mode for {args.duration:.0f}s "
+                  f"({args.readers} readers, {args.writers} writers)...")
+            results['modes'][mode] = run_mode(mode, args, workdir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    output = Path(args.output or Path(__file__).parent / 'results' / f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved {output}")
+
+
+if __name__ == '__main__':
+    main()
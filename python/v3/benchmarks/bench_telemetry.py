@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+"""Drive the step telemetry publisher at sensor rate against local subscribers
+
+Publishes synthetic step-length samples at --rate Hz (through push or the
+PULL relay input) from a copy of the data tree, with one fast subscriber
+and one slow, conflating (ZMQ_CONFLATE) subscriber on the configured topic.
+Halfway through, the reference area, the step-trigger threshold and the
+port are edited on disk to check that they are picked up without a
+restart. Prints delivered rate, latency,
+sequence gaps and the publisher's dropped/buffered counts.
+
+Usage:
+    python benchmarks/bench_telemetry.py [--rate 2000] [--duration 5] [--relay]
+"""
+import argparse
+import json
+import shutil
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import zmq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from repo_files import RepoFile  # noqa: E402
+from telemetry import StepTelemetryPublisher, TelemetryConfigSource  # noqa: E402
+
+DATA_DIR = Path(__file__).resolve().parents[3] / 'data'
+CONFIG_PATH = 'visualization/two_bar_step_visualization_config.json'
+TRIGGER_PATH = 'visualization/step_trigger_config.json'
+OVERRIDES_PATH = 'visualization/visualization_overrides.json'
+
+
+class LocalFiles:
+    """RepoFiles stand-in over a directory (version = mtime)"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def read(self, path):
+        file_path = self.root / path
+        return RepoFile(path, str(file_path.stat().st_mtime_ns), file_path.read_text(encoding='utf-8'))
+
+    def edit(self, path, update):
+        file_path = self.root / path
+        document = json.loads(file_path.read_text(encoding='utf-8'))
+        update(document)
+        file_path.write_text(json.dumps(document, indent=2), encoding='utf-8')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Subscriber(threading.Thread):
+    def __init__(self, context, port, topic, delay=0.0, conflate=False):
+        super().__init__(daemon=True)
+        self.context = context
+        self.port = port
+        self.topic = topic
+        self.delay = delay
+        self.conflate = conflate
+        self.samples = 0
+        self.frames = 0
+        self.gaps = 0
+        self.dropped = 0
+        self.latencies = []
+        self.configs = []
+        self.triggers = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        sub = self.context.socket(zmq.SUB)
+        sub.setsockopt(zmq.RCVTIMEO, 100)
+        if self.conflate:
+            # Keep only the newest frame, as a bar display would
+            sub.setsockopt(zmq.CONFLATE, 1)
+        sub.setsockopt_string(zmq.SUBSCRIBE, self.topic)
+        port = self.port
+        sub.connect(f"tcp://127.0.0.1:{port}")
+        last_seq = None
+        while not self.stop.is_set():
+            try:
+                message = sub.recv()
+            except zmq.Again:
+                continue
+            frame = json.loads(message.split(b' ', 1)[1])
+            config = frame if frame['type'] == 'config' else frame.get('config')
+            if config:
+                if not self.configs or self.configs[-1]['version'] != config['version']:
+                    self.configs.append(config)
+                if config['port'] != port:
+                    # Follow the publisher to its new port
+                    sub.disconnect(f"tcp://127.0.0.1:{port}")
+                    port = config['port']
+                    sub.connect(f"tcp://127.0.0.1:{port}")
+                if frame['type'] == 'config':
+                    continue
+            self.frames += 1
+            self.samples += len(frame['t'])
+            self.dropped += frame['dropped']
+            self.triggers += 'step_trigger' in frame
+            self.latencies.append(time.time() - frame['latest']['t'])
+            if last_seq is not None and frame['seq'] > last_seq + 1:
+                self.gaps += frame['seq'] - last_seq - 1
+            last_seq = frame['seq']
+            if self.delay:
+                time.sleep(self.delay)
+        sub.close()
+
+
+def produce(publisher, rate, duration, relay_endpoint=None, context=None):
+    """Emit samples at `rate` Hz in 1 ms chunks, with 60 negative steps out of every 2000"""
+    push = None
+    if relay_endpoint:
+        push = context.socket(zmq.PUSH)
+        push.connect(relay_endpoint)
+    started = time.time()
+    sent = 0
+    while True:
+        now = time.time()
+        if now - started >= duration:
+            break
+        due = int((now - started) * rate)
+        if due > sent:
+            index = np.arange(sent, due)
+            values = 85.0 + 10.0 * np.sin(index / 50.0)
+            # A burst of negative steps long enough to cross the trigger threshold
+            values[(index % 2000) < 60] = -1.0
+            t = np.full(len(index), now)
+            if push is not None:
+                push.send(np.column_stack((t, values, values[::-1])).astype('<f8').tobytes())
+            else:
+                publisher.push_many(t, values, values[::-1])
+            sent = due
+        time.sleep(0.001)
+    if push is not None:
+        push.close()
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=2000.0, help='samples per second')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds')
+    parser.add_argument('--batch-ms', type=float, default=10.0)
+    parser.add_argument('--slow-delay', type=float, default=0.05, help='slow subscriber pause per frame (s)')
+    parser.add_argument('--relay', action='store_true', help='feed samples through the PULL input socket')
+    args = parser.parse_args()
+
+    context = zmq.Context.instance()
+    with tempfile.TemporaryDirectory() as workdir:
+        shutil.copytree(DATA_DIR, Path(workdir) / 'data')
+        files = LocalFiles(Path(workdir) / 'data')
+        port = free_port()
+        files.edit(CONFIG_PATH, lambda d: d['zeromq_settings']['connectionSettings'].update(port=port))
+
+        relay_endpoint = f"tcp://127.0.0.1:{free_port()}" if args.relay else None
+        source = TelemetryConfigSource(files)
+        publisher = StepTelemetryPublisher(
+            source, bind_host='127.0.0.1', input_endpoint=relay_endpoint,
+            batch_interval=args.batch_ms / 1000.0, config_interval=0.2, context=context
+        )
+        publisher.start()
+        topic = source.config().topic
+        fast = Subscriber(context, port, topic)
+        slow = Subscriber(context, port, topic, delay=args.slow_delay, conflate=True)
+        fast.start()
+        slow.start()
+        time.sleep(0.5)
+
+        buffered = []
+        sampler_stop = threading.Event()
+
+        def sample_buffer():
+            while not sampler_stop.wait(0.01):
+                buffered.append(len(publisher.buffer))
+
+        threading.Thread(target=sample_buffer, daemon=True).start()
+
+        def edit_midway():
+            time.sleep(args.duration / 2)
+            files.edit(OVERRIDES_PATH, lambda d: d['visualization_overrides'].update(
+                referenceArea={'min': 70, 'max': 110}))
+            files.edit(TRIGGER_PATH, lambda d: d['step_trigger_config'].update(negativeStepCountThreshold=30))
+            files.edit(CONFIG_PATH, lambda d: d['zeromq_settings']['connectionSettings'].update(port=free_port()))
+
+        threading.Thread(target=edit_midway, daemon=True).start()
+        produced = produce(publisher, args.rate, args.duration, relay_endpoint, context)
+        time.sleep(0.5)
+        sampler_stop.set()
+        for subscriber in (fast, slow):
+            subscriber.stop.set()
+            subscriber.join()
+        status = publisher.status()
+        publisher.stop()
+
+    print(f"Produced {produced} samples in {args.duration:.1f}s ({produced / args.duration:.0f} Hz)"
+          f"{' via relay' if args.relay else ''}")
+    print(f"Publisher: {status['sent']}, max buffered {max(buffered or [0])}")
+    print(f"{'subscriber':10} {'frames':>7} {'samples':>8} {'gaps':>5} {'dropped':>8} "
+          f"{'triggers':>8} {'configs':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for name, subscriber in (('fast', fast), ('slow', slow)):
+        latencies = sorted(subscriber.latencies) or [0.0]
+        print(f"{name:10} {subscriber.frames:7} {subscriber.samples:8} {subscriber.gaps:5} "
+              f"{subscriber.dropped:8} {subscriber.triggers:8} {len(subscriber.configs):7} "
+              f"{statistics.median(latencies) * 1000:7.2f} {latencies[int(0.99 * (len(latencies) - 1))] * 1000:7.2f}")
+    final = fast.configs[-1] if fast.configs else {}
+    print(f"Config seen by fast subscriber: port {final.get('port')}, "
+          f"reference_area {final.get('reference_area')}, "
+          f"trigger threshold {final.get('step_trigger', {}).get('negativeStepCountThreshold')}")
+
+
+if __name__ == '__main__':
+    main()
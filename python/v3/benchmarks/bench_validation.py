@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Benchmark schema validation cost per document
+
+Usage:
+    python benchmarks/bench_validation.py [--data-dir ../../data] [--repeat 200]
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from validation import SchemaValidator  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--data-dir', default=str(Path(__file__).resolve().parents[3] / 'data'))
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    validator = SchemaValidator()
+    compile_ms = (time.perf_counter() - started) * 1000.0
+
+    root = Path(args.data_dir)
+    files = {
+        path.relative_to(root).as_posix(): path.read_bytes()
+        for path in sorted(root.rglob('*.json'))
+    }
+
+    timings = {path: [] for path in files}
+    for _ in range(args.repeat):
+        for path, result in validator.validate_files(files).items():
+            timings[path].append(result['ms'])
+
+    last = validator.validate_files(files)
+    print(f"Schema compile: {compile_ms:.2f} ms ({args.repeat} rounds, {len(files)} files)")
+    print(f"{'file':60} {'schema':24} {'valid':5} {'mean us':>9} {'p95 us':>9}")
+    for path, samples in timings.items():
+        samples = sorted(samples)
+        p95 = samples[int(0.95 * (len(samples) - 1))]
+        print(f"{path:60} {str(last[path]['schema']):24} {str(last[path]['valid']):5} "
+              f"{statistics.mean(samples) * 1000:9.1f} {p95 * 1000:9.1f}")
+
+    batch = [sum(round_ms) for round_ms in zip(*timings.values())]
+    print(f"Whole tree per call: {statistics.mean(batch):.3f} ms mean")
+    print(json.dumps({path: result['errors'] for path, result in last.items() if result['errors']}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""Cursor-based change feed for pushing overrides updates to devices"""
+import threading
+import time
+from collections import deque
+
+from json_patch import create_merge_patch
+
+
+class ChangeEvent:
+    """One published version of a document"""
+
+    __slots__ = ('cursor', 'sha', 'base_sha', 'document', 'delta', 'timestamp')
+
+    def __init__(self, cursor, sha, base_sha, document, delta):
+        self.cursor = cursor
+        self.sha = sha
+        self.base_sha = base_sha
+        self.document = document
+        self.delta = delta
+        self.timestamp = time.time()
+
+    def to_dict(self, full=False):
+        event = {
+            'cursor': self.cursor,
+            'sha': self.sha,
+            'timestamp': self.timestamp
+        }
+        if full or self.delta is None:
+            event['document'] = self.document
+            event['reset'] = True
+        else:
+            # Devices should only apply a delta on top of base_sha
+            event['base_sha'] = self.base_sha
+            event['delta'] = self.delta
+        return event
+
+
+class ChangeFeed:
+    """Keep the last few versions and wake waiting clients on every publish
+
+    Clients hold a cursor. ``wait(since)`` returns the events after it as
+    merge-patch deltas, or a single full-document event when the cursor is
+    unknown or has fallen out of the backlog.
+    """
+
+    def __init__(self, backlog=64):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=backlog)
+        self._cursor = 0
+        self._subscribers = 0
+
+    @property
+    def cursor(self):
+        return self._cursor
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def publish(self, sha, document):
+        """Record a new version and wake every waiting client
+
+        A version whose document equals the latest one is not an event: in
+        deploy-key mode versions are commits, and most commits do not touch
+        the overrides file.
+        """
+        with self._cond:
+            latest = self._events[-1] if self._events else None
+            if latest is not None and (latest.sha == sha or latest.document == document):
+                return latest
+            delta = create_merge_patch(latest.document, document) if latest else None
+            self._cursor += 1
+            event = ChangeEvent(self._cursor, sha, latest.sha if latest else None, document, delta)
+            self._events.append(event)
+            self._cond.notify_all()
+            return event
+
+    def wait(self, since=None, timeout=25.0):
+        """Return events newer than `since`, blocking up to `timeout` for the next one"""
+        with self._cond:
+            self._subscribers += 1
+            try:
+                if since is None:
+                    self._cond.wait_for(lambda: self._events, timeout)
+                    return [self._events[-1].to_dict(full=True)] if self._events else []
+
+                if since > self._cursor and self._events:
+                    # Cursor from before a server restart
+                    return [self._events[-1].to_dict(full=True)]
+                self._cond.wait_for(lambda: self._cursor > since, timeout)
+                if self._cursor <= since:
+                    return []
+                oldest = self._events[0].cursor
+                if since < oldest - 1:
+                    # Cursor too old for deltas: resend the full document
+                    return [self._events[-1].to_dict(full=True)]
+                return [event.to_dict() for event in self._events if event.cursor > since]
+            finally:
+                self._subscribers -= 1
@@ -0,0 +1,300 @@
+#!/usr/bin/env python
+"""Per-file commit index over the mirror clone: versions, diffs and rollback content"""
+import difflib
+import json
+import logging
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+
+import yaml
+
+from instrumentation import cache_result, phase
+from json_patch import create_json_patch
+
+log = logging.getLogger(__name__)
+
+NULL_BLOB = '0' * 40
+
+
+class HistoryError(Exception):
+    """Raised for an unknown path or version"""
+
+    def __init__(self, status_code, details):
+        super().__init__(details)
+        self.status_code = status_code
+        self.details = details
+
+
+class FileVersion:
+    """One commit that changed a tracked file"""
+
+    __slots__ = ('commit', 'timestamp', 'author', 'message', 'status', 'blob')
+
+    def __init__(self, commit, timestamp, author, message, status, blob):
+        self.commit = commit
+        self.timestamp = timestamp
+        self.author = author
+        self.message = message
+        self.status = status
+        self.blob = blob
+
+    def to_dict(self):
+        return {
+            'commit': self.commit,
+            'timestamp': self.timestamp,
+            'author': self.author,
+            'message': self.message,
+            'status': self.status,
+            'blob': self.blob
+        }
+
+
+class ConfigHistory:
+    """Index of the commits touching each tracked file of the mirror
+
+    Built once from ``git log --raw`` (after unshallowing the mirror, which
+    with the blob filter only downloads commits and trees), then extended
+    with just the new commits. The blobs of every indexed version are
+    prefetched in one request, so later version and diff lookups never go
+    upstream; their bytes are kept in a small LRU.
+
+    Mirror listeners run with the mirror lock held, so ``update`` only
+    records the new range and the index thread (``start``) does the git
+    work. ``_build_lock`` is always taken before the mirror lock.
+    """
+
+    def __init__(self, mirror, max_blobs=256, ready_timeout=5.0):
+        self.mirror = mirror
+        self.max_blobs = max_blobs
+        self.ready_timeout = ready_timeout
+        self.last_error = None
+        self._versions = {}
+        self._head = None
+        self._blobs = OrderedDict()
+        self._pending = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.RLock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    @property
+    def ready(self):
+        return self._head is not None
+
+    @property
+    def head(self):
+        """Commit the index is current to"""
+        return self._head
+
+    def start(self):
+        """Build the index once the mirror is ready, then follow its commits"""
+        threading.Thread(target=self._run, name='history-index', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def build(self):
+        """(Re)build the whole index from the local clone"""
+        with self._build_lock:
+            started = time.perf_counter()
+            self.mirror.unshallow()
+            with self.mirror.lock:
+                head = self.mirror.rev_parse('HEAD')
+                versions = self._log(head)
+            with self._lock:
+                self._versions = versions
+                self._head = head
+            self._prefetch(versions, (head,))
+            log.info("Built config history index", extra={
+                'files': len(versions),
+                'versions': sum(len(entries) for entries in versions.values()),
+                'ms': round((time.perf_counter() - started) * 1000.0, 1)
+            })
+
+    def update(self, old, new, changed):
+        """Mirror listener: queue the commits between two snapshots for the index thread"""
+        if new is None:
+            return
+        with self._lock:
+            if self._pending is None:
+                self._pending = (old, new)
+            elif old is not None and self._pending[1].commit == old.commit:
+                self._pending = (self._pending[0], new)
+            else:
+                # Not a continuation of the queued range: rebuild
+                self._pending = (None, new)
+        self._wake.set()
+
+    def ensure_ready(self, timeout=None):
+        """Build the index on first use (waits up to `timeout` for the mirror's first clone)"""
+        if self.ready:
+            return
+        if not self.mirror.wait_ready(self.ready_timeout if timeout is None else timeout):
+            raise HistoryError(503, f"Mirror is not ready yet: {self.mirror.last_error or 'cloning'}")
+        with self._build_lock:
+            if not self.ready:
+                self.build()
+
+    def paths(self):
+        """Tracked paths with their version counts"""
+        self.ensure_ready()
+        with self._lock:
+            return {path: len(entries) for path, entries in sorted(self._versions.items())}
+
+    def versions(self, path, limit=None):
+        """Newest-first commits that changed `path`"""
+        self.ensure_ready()
+        with self._lock:
+            entries = self._versions.get(path)
+        if entries is None:
+            raise HistoryError(404, f"No history for {path}")
+        return entries[:limit] if limit else list(entries)
+
+    def resolve(self, path, rev):
+        """Return (commit, blob or None) of `path` at commit/ref `rev`"""
+        self.ensure_ready()
+        snapshot = self.mirror.snapshot
+        if snapshot is not None and rev in ('HEAD', snapshot.commit):
+            return snapshot.commit, snapshot.blobs.get(path)
+        with self._lock:
+            entries = self._versions.get(path, ())
+        for entry in entries:
+            if entry.commit == rev or (len(rev) >= 7 and entry.commit.startswith(rev)):
+                return entry.commit, entry.blob
+        try:
+            commit = self.mirror.rev_parse(f"{rev}^{{commit}}")
+        except subprocess.CalledProcessError:
+            raise HistoryError(404, f"Unknown version: {rev}")
+        return commit, self.mirror.blob_at(commit, path)
+
+    def content(self, path, rev):
+        """Return (commit, bytes or None if the file did not exist)"""
+        commit, blob = self.resolve(path, rev)
+        return commit, (self._read_blob(blob) if blob else None)
+
+    def diff(self, path, rev_from, rev_to):
+        """Structural diff (JSON Patch) for JSON/YAML, unified diff otherwise"""
+        commit_from, old = self.content(path, rev_from)
+        commit_to, new = self.content(path, rev_to)
+        result = {'path': path, 'from': commit_from, 'to': commit_to}
+        with phase('history_diff'):
+            if path.lower().endswith(('.json', '.yaml', '.yml')):
+                result['format'] = 'json-patch'
+                result['operations'] = create_json_patch(parse_document(path, old), parse_document(path, new))
+            else:
+                result['format'] = 'unified'
+                result['diff'] = ''.join(difflib.unified_diff(
+                    (old or b'').decode('utf-8').splitlines(keepends=True),
+                    (new or b'').decode('utf-8').splitlines(keepends=True),
+                    fromfile=f"{path}@{commit_from[:7]}",
+                    tofile=f"{path}@{commit_to[:7]}"
+                ))
+        return result
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.ready:
+                    if self.mirror.wait_ready(1.0):
+                        self.ensure_ready()
+                    continue
+                if self._wake.wait(1.0):
+                    self._wake.clear()
+                    self._apply_pending()
+            except Exception:
+                log.exception("Updating the config history index failed")
+                self._stop.wait(5.0)
+
+    def _apply_pending(self):
+        """Index the queued commits (rebuild if they do not extend the index)"""
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        old, new = pending
+        with self._build_lock:
+            if self._head == new.commit:
+                return
+            if old is None or self._head != old.commit:
+                self.build()
+                return
+            revision_range = f"{old.commit}..{new.commit}"
+            try:
+                with self.mirror.lock:
+                    self.mirror.git('merge-base', '--is-ancestor', old.commit, new.commit)
+                    new_versions = self._log(revision_range)
+            except subprocess.CalledProcessError:
+                # Not a fast-forward (force push): start over
+                self.build()
+                return
+            with self._lock:
+                for path, entries in new_versions.items():
+                    self._versions[path] = entries + self._versions.get(path, [])
+                self._head = new.commit
+        self._prefetch(new_versions, (revision_range,))
+
+    def _log(self, revision_range):
+        """Parse `git log --raw` into path -> newest-first FileVersion lists"""
+        patterns = [f'*{ext}' for ext in self.mirror.tracked_extensions]
+        output = self.mirror.git(
+            '-c', 'core.quotePath=false', 'log', '--raw', '--no-abbrev', '--no-renames',
+            '--format=%x1e%H%x1f%ct%x1f%an%x1f%s', revision_range, '--', *patterns
+        )
+        versions = {}
+        for record in output.split('\x1e')[1:]:
+            header, _, raw = record.partition('\n')
+            commit, timestamp, author, message = header.split('\x1f', 3)
+            for line in raw.splitlines():
+                if not line.startswith(':'):
+                    continue
+                meta, path = line.split('\t', 1)
+                _old_mode, _new_mode, _old_blob, new_blob, status = meta[1:].split(' ')
+                if not path.lower().endswith(self.mirror.tracked_extensions):
+                    continue
+                versions.setdefault(path, []).append(FileVersion(
+                    commit, int(timestamp), author, message, status,
+                    None if new_blob == NULL_BLOB else new_blob
+                ))
+        return versions
+
+    def _prefetch(self, versions, revisions):
+        """Download the indexed blobs of `revisions` the blob-filtered clone does not have yet"""
+        wanted = {entry.blob for entries in versions.values() for entry in entries if entry.blob}
+        try:
+            fetched = self.mirror.fetch_missing_blobs(wanted, revisions)
+            if fetched:
+                log.info("Prefetched history blobs", extra={'count': fetched})
+            self.last_error = None
+        except subprocess.CalledProcessError as e:
+            # Versions are still readable; git fetches each missing blob on demand
+            self.last_error = e.stderr.decode(errors='replace') if e.stderr else str(e)
+            log.warning("History prefetch failed", extra={'error': self.last_error})
+
+    def _read_blob(self, blob):
+        with self._lock:
+            data = self._blobs.get(blob)
+            if data is not None:
+                self._blobs.move_to_end(blob)
+        if data is not None:
+            cache_result('history_blobs', 'hit')
+            return data
+        cache_result('history_blobs', 'miss')
+        data = self.mirror.read_blob(blob)
+        with self._lock:
+            self._blobs[blob] = data
+            while len(self._blobs) > self.max_blobs:
+                self._blobs.popitem(last=False)
+        return data
+
+
+def parse_document(path, raw):
+    """Parse JSON or YAML bytes (None for a missing file)"""
+    if raw is None:
+        return None
+    text = raw.decode('utf-8')
+    if path.lower().endswith(('.yaml', '.yml')):
+        return yaml.safe_load(text)
+    return json.loads(text)
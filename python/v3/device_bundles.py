@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+"""One-shot per-device configuration bundles resolved from startup.json"""
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from instrumentation import cache_result, phase
+
+log = logging.getLogger(__name__)
+
+STARTUP_PATH = 'startup.json'
+
+
+class DeviceNotFound(KeyError):
+    """Raised when a device id is not listed in startup.json"""
+
+
+class Bundle:
+    """A precomputed, compressed bundle for one device"""
+
+    __slots__ = ('device_id', 'etag', 'inputs', 'body', 'gzip_body', 'built_at')
+
+    def __init__(self, device_id, etag, inputs, body):
+        self.device_id = device_id
+        self.etag = etag
+        self.inputs = inputs
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+        self.built_at = time.time()
+
+
+class DeviceBundles:
+    """Resolve every file a device reads at boot into a single document
+
+    A bundle is keyed by the versions of all of its inputs; it is rebuilt
+    only when one of them changes, and ``precompute_all`` lets the mirror
+    rebuild bundles as soon as a referenced file is updated.
+    """
+
+    def __init__(self, files, startup_path=STARTUP_PATH):
+        self.files = files
+        self.startup_path = startup_path
+        self._bundles = {}
+        self._lock = threading.Lock()
+
+    def get(self, device_id):
+        """Return an up-to-date Bundle for `device_id`"""
+        startup_file = self.files.read(self.startup_path)
+        startup = json.loads(startup_file.text)
+        device, paths = self._resolve(startup, device_id)
+        inputs = {self.startup_path: startup_file.version}
+        contents = {}
+        for path in sorted(set(paths.values())):
+            repo_file = self.files.read(path)
+            inputs[path] = repo_file.version
+            contents[path] = repo_file
+
+        with self._lock:
+            cached = self._bundles.get(device_id)
+        if cached is not None and cached.inputs == inputs:
+            cache_result('device_bundles', 'hit')
+            return cached
+
+        cache_result('device_bundles', 'miss')
+        with phase('bundle_build'):
+            bundle = self._build(startup, device, paths, contents, inputs)
+        with self._lock:
+            self._bundles[device_id] = bundle
+        return bundle
+
+    def input_paths(self):
+        """Return every path any cached bundle depends on"""
+        paths = {self.startup_path}
+        with self._lock:
+            for bundle in self._bundles.values():
+                paths.update(bundle.inputs)
+        return paths
+
+    def precompute_all(self):
+        """Build bundles for every device listed in startup.json"""
+        startup = json.loads(self.files.read(self.startup_path).text)
+        for device in startup.get('devices', []):
+            try:
+                self.get(device['id'])
+            except Exception:
+                log.exception("Failed to precompute bundle", extra={'device_id': device.get('id')})
+
+    def _resolve(self, startup, device_id):
+        device = next((d for d in startup.get('devices', []) if d.get('id') == device_id), None)
+        if device is None:
+            raise DeviceNotFound(device_id)
+
+        # Named references, in the order a device would fetch them
+        paths = {}
+        for section in ('ros_info', 'visualization_lists'):
+            for key, path in startup.get(section, {}).items():
+                if isinstance(path, str) and key.endswith('_path'):
+                    paths[f"{section}.{key}"] = path
+        if device.get('device_data_path'):
+            paths['device_data_path'] = device['device_data_path']
+        return device, paths
+
+    def _build(self, startup, device, paths, contents, inputs):
+        files = {}
+        for path, repo_file in contents.items():
+            entry = {'version': repo_file.version}
+            if path.endswith('.json'):
+                entry['format'] = 'json'
+                entry['content'] = json.loads(repo_file.text)
+            else:
+                entry['format'] = path.rsplit('.', 1)[-1]
+                entry['text'] = repo_file.text
+            files[path] = entry
+
+        device_id = device['id']
+        groups = [
+            group for group in startup.get('device_groups', [])
+            if device_id in group.get('device_names', [])
+        ]
+        fingerprint = json.dumps([device_id, sorted(inputs.items())]).encode()
+        etag = hashlib.sha1(fingerprint).hexdigest()
+        document = {
+            'device_id': device_id,
+            'version': etag,
+            'top_level_master_id': startup.get('top_level_master_id'),
+            'startup': startup,
+            'device': device,
+            'device_groups': groups,
+            'paths': paths,
+            'files': files
+        }
+        body = json.dumps(document, separators=(',', ':')).encode()
+        return Bundle(device_id, etag, inputs, body)
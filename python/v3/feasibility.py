@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+"""Workspace and joint-limit feasibility checks driven by params.yaml"""
+import json
+import threading
+import time
+
+import numpy as np
+import yaml
+
+# Violation bits of the per-target mask
+WORKSPACE_X = 1
+WORKSPACE_Y = 2
+WORKSPACE_Z = 4
+JOINT_LIMIT = 8
+JOINT_VELOCITY = 16
+
+VIOLATION_NAMES = {
+    WORKSPACE_X: 'workspace_x',
+    WORKSPACE_Y: 'workspace_y',
+    WORKSPACE_Z: 'workspace_z',
+    JOINT_LIMIT: 'joint_limit',
+    JOINT_VELOCITY: 'joint_velocity'
+}
+
+
+def violation_names(bits):
+    return [name for bit, name in VIOLATION_NAMES.items() if bits & bit]
+
+
+def summarize(mask):
+    """Count violations of a mask by kind"""
+    mask = np.asarray(mask)
+    return {
+        'checked': int(mask.size),
+        'infeasible': int(np.count_nonzero(mask)),
+        'violations': {name: int(np.count_nonzero(mask & bit)) for bit, name in VIOLATION_NAMES.items()}
+    }
+
+
+class FeasibilityChecker:
+    """Batch checks against the `workspace` and `robot` sections of params.yaml
+
+    Targets are (N, 3) arrays in either the force-torque sensor frame ("ft",
+    rotated into the base frame with ``ft2base``) or the base frame. Joint
+    arrays are (N, J) in the units of ``joint_bounds``; ``joint_vel_max`` is
+    taken in the same unit per second.
+    """
+
+    def __init__(self, params):
+        workspace = params['workspace']
+        self.lower = np.array([workspace[f'{axis}_min'] for axis in 'xyz'], dtype=float)
+        self.upper = np.array([workspace[f'{axis}_max'] for axis in 'xyz'], dtype=float)
+        self.ft2base = np.array(workspace['ft2base'], dtype=float)
+        self.base2ft = np.array(workspace.get('base2ft', self.ft2base.T), dtype=float)
+        if not np.allclose(self.ft2base @ self.ft2base.T, np.eye(3)):
+            raise ValueError('workspace.ft2base is not a rotation matrix')
+        if not np.allclose(self.base2ft @ self.ft2base, np.eye(3)):
+            raise ValueError('workspace.base2ft is not the inverse of ft2base')
+
+        robot = params.get('robot', {})
+        bounds = np.array(robot.get('joint_bounds', []), dtype=float).reshape(-1, 2)
+        self.joint_lower = bounds[:, 0]
+        self.joint_upper = bounds[:, 1]
+        self.joint_vel_max = robot.get('joint_vel_max')
+
+    @classmethod
+    def from_yaml(cls, text):
+        return cls(yaml.safe_load(text))
+
+    def to_base(self, points, frame='ft', scale=1.0):
+        """Rotate (N, 3) targets into the base frame"""
+        points = np.asarray(points, dtype=float).reshape(-1, 3) * scale
+        if frame == 'base':
+            return points
+        if frame == 'ft':
+            return points @ self.ft2base.T
+        raise ValueError(f"Unknown frame {frame!r} (expected 'ft' or 'base')")
+
+    def check_targets(self, points, frame='ft', scale=1.0):
+        """Return the violation mask (N,) of targets against the workspace box"""
+        base = self.to_base(points, frame, scale)
+        outside = (base < self.lower) | (base > self.upper)
+        mask = (
+            outside[:, 0] * WORKSPACE_X
+            | outside[:, 1] * WORKSPACE_Y
+            | outside[:, 2] * WORKSPACE_Z
+        )
+        return mask.astype(np.uint8)
+
+    def check_joints(self, positions, dt=None):
+        """Return the violation mask (N,) of joint configurations
+
+        With `dt`, consecutive rows are treated as a trajectory and the finite
+        difference velocity is checked against ``joint_vel_max`` too.
+        """
+        positions = np.asarray(positions, dtype=float)
+        if positions.ndim != 2 or positions.shape[1] != len(self.joint_lower):
+            raise ValueError(f"Joint positions must have shape (N, {len(self.joint_lower)})")
+        outside = (positions < self.joint_lower) | (positions > self.joint_upper)
+        mask = np.where(outside.any(axis=1), JOINT_LIMIT, 0).astype(np.uint8)
+        if dt and self.joint_vel_max is not None and len(positions) > 1:
+            velocity = np.abs(np.diff(positions, axis=0)) / dt
+            too_fast = (velocity > self.joint_vel_max).any(axis=1)
+            mask[1:] |= np.where(too_fast, JOINT_VELOCITY, 0).astype(np.uint8)
+        return mask
+
+
+class FeasibilityService:
+    """Check the task table referenced by startup.json against params.yaml
+
+    Reports are cached by the versions of both files, so they are computed
+    once per change; the mirror listener calls ``check`` right after a save.
+    """
+
+    def __init__(self, files, task_tables, startup_path='startup.json',
+                 task_frame='ft', task_scale=0.01):
+        self.files = files
+        self.task_tables = task_tables
+        self.startup_path = startup_path
+        self.task_frame = task_frame
+        self.task_scale = task_scale
+        self._checker = None
+        self._checker_version = None
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def input_paths(self):
+        ros_info = self._ros_info()
+        return {self.startup_path, *(
+            ros_info[key] for key in ('config_yaml_path', 'task_information_path') if ros_info.get(key)
+        )}
+
+    def checker(self):
+        params_file = self.files.read(self._ros_info()['config_yaml_path'])
+        with self._lock:
+            if self._checker is None or self._checker_version != params_file.version:
+                self._checker = FeasibilityChecker.from_yaml(params_file.text)
+                self._checker_version = params_file.version
+                self._reports.clear()
+            return self._checker
+
+    def check(self, task_path=None):
+        """Return the feasibility report of a task CSV (default: task_information_path)"""
+        task_path = task_path or self._ros_info()['task_information_path']
+        checker = self.checker()
+        task_file = self.files.read(task_path)
+        key = (task_path, task_file.version)
+        with self._lock:
+            report = self._reports.get(key)
+        if report is not None:
+            return report
+
+        started = time.perf_counter()
+        table = self.task_tables.load(task_file.text, name=task_path)
+        positions, _ = table.final_poses()
+        mask = checker.check_targets(positions, self.task_frame, self.task_scale)
+        infeasible = np.flatnonzero(mask)
+        report = {
+            'path': task_path,
+            'version': task_file.version,
+            'params_version': self._checker_version,
+            **summarize(mask),
+            'infeasible_rows': [
+                {
+                    'exp': int(table.exp[i]),
+                    'sub_exp': int(table.sub_exp[i]),
+                    'violations': violation_names(int(mask[i]))
+                }
+                for i in infeasible
+            ],
+            'ms': (time.perf_counter() - started) * 1000.0
+        }
+        with self._lock:
+            self._reports[key] = report
+        return report
+
+    def _ros_info(self):
+        return json.loads(self.files.read(self.startup_path).text).get('ros_info', {})
@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+"""Content-addressed manifest of the tracked files and delta sync against it"""
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import cache_result, phase
+
+log = logging.getLogger(__name__)
+
+
+class _ManifestMoved(Exception):
+    """A file changed between listing it and reading it"""
+
+
+class ManifestEntry:
+    """One tracked file: sha256 of its bytes, size and upstream version (blob sha)"""
+
+    __slots__ = ('path', 'hash', 'size', 'version')
+
+    def __init__(self, path, hash, size, version):
+        self.path = path
+        self.hash = hash
+        self.size = size
+        self.version = version
+
+    def to_dict(self):
+        return {'path': self.path, 'hash': self.hash, 'size': self.size, 'version': self.version}
+
+
+class Manifest:
+    """Immutable set of entries identified by the hash of their (path, hash) pairs"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        digest = hashlib.sha256()
+        for path in sorted(entries):
+            digest.update(f"{path}\0{entries[path].hash}\n".encode('utf-8'))
+        self.hash = digest.hexdigest()
+        self.built_at = time.time()
+        self.body = json.dumps({
+            'manifest': self.hash,
+            'files': [entries[path].to_dict() for path in sorted(entries)]
+        }).encode('utf-8')
+        self.gzip_body = gzip.compress(self.body, compresslevel=6)
+
+    def hashes(self):
+        return {path: entry.hash for path, entry in self.entries.items()}
+
+
+class Delta:
+    """Compressed sync response from one manifest (or client file list) to another"""
+
+    __slots__ = ('manifest', 'base', 'full', 'changed', 'deleted', 'body', 'gzip_body')
+
+    def __init__(self, manifest, base, full, changed, deleted, body):
+        self.manifest = manifest
+        self.base = base
+        self.full = full
+        self.changed = changed
+        self.deleted = deleted
+        self.body = body
+        self.gzip_body = gzip.compress(body, compresslevel=6)
+
+
+class ManifestIndex:
+    """Keep the manifest current and answer delta syncs
+
+    The listing of tracked files (path -> blob sha) tells which files
+    changed since the last build, so only those are read and re-hashed.
+    Recent manifests are kept by hash so a device can sync from the hash it
+    last saw; a hash the server no longer knows gets a full response, and
+    a client may instead send its own ``{path: hash}`` list. Deltas are
+    cached, so many devices reconnecting from the same version share one
+    computed and compressed body.
+    """
+
+    def __init__(self, files, max_manifests=32, max_deltas=64):
+        self.files = files
+        self.max_manifests = max_manifests
+        self.max_deltas = max_deltas
+        self._manifest = None
+        self._listing = None
+        self._manifests = OrderedDict()
+        self._deltas = OrderedDict()
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def current(self):
+        """Return the manifest of the current listing, rebuilding changed entries only"""
+        listing = self.files.listing()
+        manifest = self._manifest
+        if manifest is not None and self._listing == listing:
+            cache_result('manifest', 'hit')
+            return manifest
+
+        with self._build_lock:
+            manifest = self._manifest
+            if manifest is not None and self._listing == listing:
+                cache_result('manifest', 'hit')
+                return manifest
+            cache_result('manifest', 'miss')
+            with phase('manifest_build'):
+                previous = manifest.entries if manifest is not None else {}
+                entries = {}
+                rehashed = 0
+                consistent = True
+                for path, version in listing.items():
+                    entry = previous.get(path)
+                    if entry is None or entry.version != version:
+                        entry = self._hash_entry(path, version)
+                        rehashed += 1
+                    consistent = consistent and entry.version == version
+                    entries[path] = entry
+                manifest = Manifest(entries)
+            with self._lock:
+                self._manifest = manifest
+                # A file newer than the listing: keep re-listing until they agree
+                self._listing = listing if consistent else None
+                self._manifests[manifest.hash] = manifest
+                self._manifests.move_to_end(manifest.hash)
+                while len(self._manifests) > self.max_manifests:
+                    self._manifests.popitem(last=False)
+            log.info("Manifest updated", extra={
+                'manifest': manifest.hash, 'files': len(entries), 'rehashed': rehashed
+            })
+            return manifest
+
+    def update(self, old, new, changed):
+        """Mirror listener: refresh the manifest as soon as files are written"""
+        try:
+            self.current()
+        except Exception:
+            log.exception("Manifest update failed")
+
+    def delta(self, since=None, client_hashes=None):
+        """Return the Delta from `since` (a manifest hash) or from `client_hashes`"""
+        for _attempt in range(3):
+            try:
+                return self._delta(self.current(), since, client_hashes)
+            except _ManifestMoved:
+                # A file was written while we were answering; retry against the new manifest
+                continue
+        raise RuntimeError('Files kept changing while building the sync response')
+
+    def _delta(self, manifest, since, client_hashes):
+        if client_hashes is not None:
+            base_hashes, base, full = client_hashes, None, False
+        else:
+            with self._lock:
+                known = self._manifests.get(since) if since else None
+            base_hashes = known.hashes() if known is not None else {}
+            base, full = (since, False) if known is not None else (None, True)
+
+        key = (manifest.hash, base) if client_hashes is None else None
+        if key is not None:
+            with self._lock:
+                cached = self._deltas.get(key)
+                if cached is not None:
+                    self._deltas.move_to_end(key)
+            if cached is not None:
+                cache_result('manifest_delta', 'hit')
+                return cached
+        cache_result('manifest_delta', 'miss')
+
+        with phase('manifest_delta'):
+            changed = sorted(
+                path for path, entry in manifest.entries.items() if base_hashes.get(path) != entry.hash
+            )
+            deleted = sorted(path for path in base_hashes if path not in manifest.entries)
+            files = []
+            for path in changed:
+                entry = manifest.entries[path]
+                repo_file = self.files.read(path)
+                if repo_file.version != entry.version:
+                    self.files.invalidate(path)
+                    raise _ManifestMoved(path)
+                files.append({**entry.to_dict(), 'content': repo_file.text})
+            body = json.dumps({
+                'manifest': manifest.hash,
+                'base': base,
+                'full': full,
+                'files': files,
+                'deleted': deleted
+            }).encode('utf-8')
+            delta = Delta(manifest.hash, base, full, changed, deleted, body)
+
+        if key is not None:
+            with self._lock:
+                self._deltas[key] = delta
+                while len(self._deltas) > self.max_deltas:
+                    self._deltas.popitem(last=False)
+        return delta
+
+    def _hash_entry(self, path, version):
+        repo_file = self.files.read(path)
+        if repo_file.version != version:
+            # The file cache and the listing expire separately (API mode): revalidate both
+            self.files.invalidate(path)
+            repo_file = self.files.read(path)
+        raw = repo_file.text.encode('utf-8')
+        return ManifestEntry(path, hashlib.sha256(raw).hexdigest(), len(raw), repo_file.version)
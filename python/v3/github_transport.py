@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+"""Pooled, timeout-bounded HTTP transport for the GitHub REST API"""
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from instrumentation import UPSTREAM_REQUESTS
+
+log = logging.getLogger(__name__)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class GitHubTransport:
+    """Send GitHub API requests over a keep-alive session
+
+    Every call is bounded by a (connect, read) timeout. Transient failures
+    (connection errors, 5xx, 429 and secondary rate limits) are retried with
+    jittered exponential backoff, honouring ``Retry-After``. The primary
+    rate limit is tracked from ``X-RateLimit-*`` headers; once fewer than
+    ``min_remaining`` calls are left, requests are paced out until the reset
+    instead of running into 403s.
+
+    ``base_url`` (or a custom ``session``) lets a local stand-in server
+    replace api.github.com.
+    """
+
+    def __init__(self, base_url='https://api.github.com', token=None,
+                 connect_timeout=3.05, read_timeout=10.0, max_retries=3,
+                 backoff=0.5, max_wait=30.0, min_remaining=10, pool_size=10,
+                 session=None):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_wait = max_wait
+        self.min_remaining = min_remaining
+
+        self.session = session or requests.Session()
+        if session is None:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+        self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if token:
+            self.session.headers["Authorization"] = f"token {token}"
+
+        self._rate_lock = threading.Lock()
+        self.rate_limit = {'limit': None, 'remaining': None, 'reset': None}
+
+    def url(self, path):
+        """Build an absolute API URL from a path such as /repos/{owner}/{repo}/..."""
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, headers=None, json=None, timeout=None):
+        """Send one API request, retrying transient failures"""
+        url = self.url(path)
+        attempt = 0
+        while True:
+            self._pace()
+            started = time.perf_counter()
+            try:
+                response = self.session.request(
+                    method, url,
+                    headers=headers,
+                    json=json,
+                    timeout=timeout or self.timeout
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                UPSTREAM_REQUESTS.observe(time.perf_counter() - started, method=method, status='error')
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+                attempt += 1
+                continue
+
+            UPSTREAM_REQUESTS.observe(time.perf_counter() - started, method=method, status=response.status_code)
+            self._track_rate_limit(response)
+            delay = self._retry_delay(response, attempt)
+            if delay is None:
+                return response
+            log.warning(
+                "GitHub request failed, retrying",
+                extra={'method': method, 'path': path, 'status': response.status_code, 'delay': round(delay, 2)}
+            )
+            time.sleep(delay)
+            attempt += 1
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request('PUT', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request('PATCH', path, **kwargs)
+
+    def _retry_delay(self, response, attempt):
+        """Return how long to wait before retrying, or None if the response is final"""
+        if attempt >= self.max_retries:
+            return None
+
+        status = response.status_code
+        if status == 403 and not self._is_rate_limited(response):
+            return None
+        if status != 403 and status not in RETRY_STATUS_CODES:
+            return None
+
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.max_wait)
+            except ValueError:
+                pass
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = self._to_float(response.headers.get('X-RateLimit-Reset'))
+            if reset is not None:
+                return min(max(reset - time.time(), 0.0) + 1.0, self.max_wait)
+        return self._backoff_delay(attempt)
+
+    @staticmethod
+    def _is_rate_limited(response):
+        if response.headers.get('Retry-After') is not None:
+            return True
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            return True
+        return 'rate limit' in response.text.lower()
+
+    def _backoff_delay(self, attempt):
+        return min(self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5), self.max_wait)
+
+    def _track_rate_limit(self, response):
+        remaining = self._to_float(response.headers.get('X-RateLimit-Remaining'))
+        if remaining is None:
+            return
+        with self._rate_lock:
+            self.rate_limit = {
+                'limit': self._to_float(response.headers.get('X-RateLimit-Limit')),
+                'remaining': remaining,
+                'reset': self._to_float(response.headers.get('X-RateLimit-Reset'))
+            }
+
+    def _pace(self):
+        """Spread the last few calls of the rate-limit window until its reset"""
+        with self._rate_lock:
+            remaining = self.rate_limit['remaining']
+            reset = self.rate_limit['reset']
+        if remaining is None or reset is None or remaining >= self.min_remaining:
+            return
+        window = reset - time.time()
+        if window <= 0:
+            return
+        time.sleep(min(window / max(remaining, 1.0), self.max_wait))
+
+    @staticmethod
+    def _to_float(value):
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
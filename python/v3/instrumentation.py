@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""Structured logging and Prometheus-style metrics for the visualizer backend"""
+import bisect
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self):
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.samples().items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    """A value read from a callback at scrape time"""
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self):
+        try:
+            value = float(self.read())
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {value:g}"]
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            return {key: (list(counts), total, count) for key, (counts, total, count) in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total, count) in sorted(self.samples().items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read):
+        """Register (or replace) a callback gauge"""
+        with self._lock:
+            self._metrics[name] = Gauge(name, help, read)
+            return self._metrics[name]
+
+    def render(self):
+        """Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = MetricsRegistry()
+
+PHASE_SECONDS = METRICS.histogram(
+    'visualizer_phase_seconds',
+    'Time spent per processing phase (upstream fetch, decode, parse, validation, git)',
+    ('phase',)
+)
+CACHE_REQUESTS = METRICS.counter(
+    'visualizer_cache_requests_total',
+    'Cache lookups by cache and result (hit, miss, revalidated, stale)',
+    ('cache', 'result')
+)
+HTTP_REQUESTS = METRICS.histogram(
+    'visualizer_http_request_seconds',
+    'HTTP request latency by endpoint, method and status',
+    ('endpoint', 'method', 'status')
+)
+UPSTREAM_REQUESTS = METRICS.histogram(
+    'visualizer_github_request_seconds',
+    'GitHub API request latency by method and status',
+    ('method', 'status')
+)
+
+
+def phase(name):
+    """Time a block as one processing phase"""
+    return PHASE_SECONDS.time(phase=name)
+
+
+def cache_result(cache, result):
+    CACHE_REQUESTS.inc(cache=cache, result=result)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; `extra=` fields become top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Keep a fraction of records below WARNING; warnings and errors always pass"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or self.rate >= 1.0 or random.random() < self.rate
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_logging(level=None, fmt=None, sample_rate=None):
+    """Set up the root handler once (LOG_LEVEL, LOG_FORMAT=json|text, LOG_SAMPLE_RATE)"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        level = level or os.environ.get('LOG_LEVEL', 'INFO')
+        fmt = fmt or os.environ.get('LOG_FORMAT', 'json')
+        sample_rate = float(sample_rate if sample_rate is not None else os.environ.get('LOG_SAMPLE_RATE', '1'))
+
+        handler = logging.StreamHandler(sys.stderr)
+        if fmt == 'json':
+            handler.setFormatter(JsonFormatter())
+        else:
+            handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        handler.addFilter(SamplingFilter(sample_rate))
+
+        root = logging.getLogger()
+        root.addHandler(handler)
+        root.setLevel(level.upper())
+        _configured = True
@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+"""JSON Patch (RFC 6902) and JSON merge patch (RFC 7386) helpers"""
+import copy
+
+
+def create_merge_patch(source, target):
+    """Build the merge patch that turns `source` into `target`"""
+    if not isinstance(source, dict) or not isinstance(target, dict):
+        return copy.deepcopy(target)
+
+    patch = {}
+    for key in source:
+        if key not in target:
+            patch[key] = None
+    for key, value in target.items():
+        if key not in source:
+            patch[key] = copy.deepcopy(value)
+        elif source[key] != value:
+            patch[key] = create_merge_patch(source[key], value)
+    return patch
+
+
+def apply_merge_patch(target, patch):
+    """Return a copy of `target` with a merge patch applied"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+class JsonPatchError(Exception):
+    """Raised when a patch is malformed or cannot be applied"""
+
+
+class JsonPatchTestFailed(JsonPatchError):
+    """Raised when a JSON Patch `test` operation does not match"""
+
+
+def parse_pointer(pointer):
+    """Split a JSON Pointer (RFC 6901) into reference tokens"""
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def _resolve(document, tokens):
+    node = document
+    for token in tokens:
+        if isinstance(node, dict):
+            if token not in node:
+                raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+            node = node[token]
+        elif isinstance(node, list):
+            node = node[_list_index(node, token)]
+        else:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+    return node
+
+
+def _list_index(node, token, allow_end=False):
+    if allow_end and token == '-':
+        return len(node)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(node) or (index == len(node) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _add(document, tokens, value):
+    if not tokens:
+        return value
+    parent = _resolve(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_list_index(parent, key, allow_end=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add to a scalar at /{'/'.join(tokens[:-1])}")
+    return document
+
+
+def _remove(document, tokens):
+    if not tokens:
+        raise JsonPatchError("Cannot remove the document root")
+    parent = _resolve(document, tokens[:-1])
+    key = tokens[-1]
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_list_index(parent, key))
+    raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+
+
+def _check_operations(operations):
+    """Raise JsonPatchError unless `operations` is an array of {op, path} objects"""
+    if not isinstance(operations, list):
+        raise JsonPatchError("A JSON Patch must be an array of operations")
+    for operation in operations:
+        if not isinstance(operation, dict) or not isinstance(operation.get('op'), str) \
+                or not isinstance(operation.get('path'), str):
+            raise JsonPatchError(f"Invalid operation: {operation!r}")
+        if operation['op'] in ('move', 'copy') and not isinstance(operation.get('from'), str):
+            raise JsonPatchError(f"Operation {operation['op']} requires a from pointer")
+
+
+def apply_json_patch(document, operations):
+    """Return a copy of `document` with RFC 6902 operations applied atomically"""
+    _check_operations(operations)
+
+    result = copy.deepcopy(document)
+    for operation in operations:
+        op = operation['op']
+        tokens = parse_pointer(operation['path'])
+
+        if op in ('add', 'replace', 'test') and 'value' not in operation:
+            raise JsonPatchError(f"Operation {op} requires a value")
+        if op == 'add':
+            result = _add(result, tokens, copy.deepcopy(operation['value']))
+        elif op == 'remove':
+            _remove(result, tokens)
+        elif op == 'replace':
+            _resolve(result, tokens)
+            if not tokens:
+                result = copy.deepcopy(operation['value'])
+            else:
+                # Replace in place so object key order is preserved
+                parent = _resolve(result, tokens[:-1])
+                index = tokens[-1] if isinstance(parent, dict) else int(tokens[-1])
+                parent[index] = copy.deepcopy(operation['value'])
+        elif op in ('move', 'copy'):
+            from_tokens = parse_pointer(operation['from'])
+            if op == 'move' and tokens[:len(from_tokens)] == from_tokens and tokens != from_tokens:
+                raise JsonPatchError("Cannot move a value into one of its children")
+            value = copy.deepcopy(_resolve(result, from_tokens))
+            if op == 'move':
+                _remove(result, from_tokens)
+            result = _add(result, tokens, value)
+        elif op == 'test':
+            if _resolve(result, tokens) != operation['value']:
+                raise JsonPatchTestFailed(f"Test failed at {operation['path']}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+    return result
+
+
+def json_patch_paths(operations):
+    """Return the token paths written by a JSON Patch (tests excluded)"""
+    _check_operations(operations)
+    paths = []
+    for operation in operations:
+        if operation['op'] == 'test':
+            continue
+        paths.append(tuple(parse_pointer(operation['path'])))
+        if operation['op'] == 'move':
+            paths.append(tuple(parse_pointer(operation['from'])))
+    return paths
+
+
+def merge_patch_paths(patch, prefix=()):
+    """Return the token paths written by a merge patch"""
+    if not isinstance(patch, dict):
+        return [prefix]
+    paths = []
+    for key, value in patch.items():
+        if isinstance(value, dict) and value:
+            paths.extend(merge_patch_paths(value, prefix + (key,)))
+        else:
+            paths.append(prefix + (key,))
+    return paths
+
+
+def diff_paths(source, target, prefix=()):
+    """Return the token paths at which two documents differ"""
+    if isinstance(source, dict) and isinstance(target, dict):
+        paths = []
+        for key in set(source) | set(target):
+            if key not in source or key not in target:
+                paths.append(prefix + (key,))
+            elif source[key] != target[key]:
+                paths.extend(diff_paths(source[key], target[key], prefix + (key,)))
+        return paths
+    return [] if source == target else [prefix]
+
+
+def format_pointer(tokens):
+    """Join reference tokens into a JSON Pointer (RFC 6901)"""
+    return ''.join('/' + str(token).replace('~', '~0').replace('/', '~1') for token in tokens)
+
+
+def create_json_patch(source, target, prefix=()):
+    """Build a JSON Patch turning `source` into `target`
+
+    Objects are compared key by key and lists index by index, so the
+    operations double as a structural diff; every replace/remove also
+    carries the previous value as ``old`` (ignored when applying).
+    """
+    if isinstance(source, dict) and isinstance(target, dict):
+        operations = []
+        for key in source:
+            if key not in target:
+                operations.append({'op': 'remove', 'path': format_pointer(prefix + (key,)), 'old': source[key]})
+        for key, value in target.items():
+            if key not in source:
+                operations.append({'op': 'add', 'path': format_pointer(prefix + (key,)), 'value': value})
+            elif source[key] != value:
+                operations.extend(create_json_patch(source[key], value, prefix + (key,)))
+        return operations
+    if isinstance(source, list) and isinstance(target, list):
+        operations = []
+        for index in range(min(len(source), len(target))):
+            if source[index] != target[index]:
+                operations.extend(create_json_patch(source[index], target[index], prefix + (index,)))
+        for index in range(len(source), len(target)):
+            operations.append({'op': 'add', 'path': format_pointer(prefix + ('-',)), 'value': target[index]})
+        # Remove from the end so earlier indexes stay valid
+        for index in range(len(source) - 1, len(target) - 1, -1):
+            operations.append({'op': 'remove', 'path': format_pointer(prefix + (index,)), 'old': source[index]})
+        return operations
+    if source == target and type(source) is type(target):
+        return []
+    return [{'op': 'replace', 'path': format_pointer(prefix), 'value': target, 'old': source}]
+
+
+def paths_overlap(paths_a, paths_b):
+    """True if any path of one set equals or contains a path of the other"""
+    for a in paths_a:
+        for b in paths_b:
+            shorter = min(len(a), len(b))
+            if a[:shorter] == b[:shorter]:
+                return True
+    return False
@@ -0,0 +1,246 @@
+#!/usr/bin/env python
+"""Versioned snapshot cache for files read from the AR_info_data repository"""
+import base64
+import copy
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from instrumentation import cache_result, phase
+
+log = logging.getLogger(__name__)
+
+# 필수 색상 키 목록
+REQUIRED_COLOR_KEYS = ['barForeground', 'referenceLine', 'referenceArea']
+
+
+def apply_overrides_defaults(content_json):
+    """Return a copy of the overrides document with default values filled in"""
+    content_json = copy.deepcopy(content_json)
+    overrides = content_json.get('visualization_overrides')
+    if not isinstance(overrides, dict):
+        return content_json
+
+    # referenceLine 기본값 추가
+    if 'referenceLine' not in overrides:
+        overrides['referenceLine'] = {'value': 50}
+
+    # referenceArea 기본값 추가
+    if 'referenceArea' not in overrides:
+        overrides['referenceArea'] = {'min': 45, 'max': 55}
+
+    # 색상 키에 referenceLine과 referenceArea 추가
+    colors = overrides.get('colors')
+    if isinstance(colors, dict):
+        if 'referenceLine' not in colors:
+            colors['referenceLine'] = {'r': 1.0, 'g': 0.0, 'b': 0.0, 'a': 1.0}
+        if 'referenceArea' not in colors:
+            colors['referenceArea'] = {'r': 1.0, 'g': 0.8, 'b': 0.8, 'a': 0.5}
+
+    return content_json
+
+
+def extract_color_keys(content_json):
+    """Return the color keys of an overrides document, or None if it has no colors"""
+    overrides = content_json.get('visualization_overrides')
+    if not isinstance(overrides, dict) or not isinstance(overrides.get('colors'), dict):
+        return None
+
+    color_keys = list(overrides['colors'].keys())
+    # 필수 키가 없으면 추가
+    for key in REQUIRED_COLOR_KEYS:
+        if key not in color_keys:
+            color_keys.append(key)
+    return color_keys
+
+
+def derive_overrides(document):
+    """Compute the per-version views served by /overrides and /color-keys"""
+    return {
+        'content': json.dumps(apply_overrides_defaults(document), indent=2),
+        'color_keys': extract_color_keys(document)
+    }
+
+
+class UpstreamError(Exception):
+    """Raised when the upstream fetch fails and no cached version can be served"""
+
+    def __init__(self, status_code, details):
+        super().__init__(details)
+        self.status_code = status_code
+        self.details = details
+
+
+class Snapshot:
+    """Immutable view of one version of a repository file"""
+
+    __slots__ = ('sha', 'content', 'document', 'derived', 'etag', 'fetched_at')
+
+    def __init__(self, sha, content, etag=None, derive=None, parse=json.loads):
+        document = None
+        if parse:
+            with phase('json_parse'):
+                document = parse(content)
+        object.__setattr__(self, 'sha', sha)
+        object.__setattr__(self, 'content', content)
+        object.__setattr__(self, 'document', document)
+        if derive:
+            with phase('derive'):
+                derived = derive(document)
+        else:
+            derived = {}
+        object.__setattr__(self, 'derived', derived)
+        object.__setattr__(self, 'etag', etag)
+        object.__setattr__(self, 'fetched_at', time.time())
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Snapshot is immutable')
+
+
+class _Flight:
+    """One in-progress upstream fetch shared by every concurrent caller"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SnapshotCache:
+    """Cache the latest version of one file and revalidate it with ETags
+
+    ``fetch(etag)`` must return a response-like object (``status_code``,
+    ``headers``, ``json()``, ``text``) shaped like the GitHub contents API.
+    A 304 answer keeps the current snapshot, so an unchanged file costs one
+    conditional request per TTL instead of a download, decode and parse.
+    Concurrent misses wait on a single fetch. ``name`` labels the cache's
+    hit/miss counters.
+    """
+
+    def __init__(self, fetch, ttl=5.0, derive=None, max_versions=8, parse=json.loads,
+                 name='overrides'):
+        self.name = name
+        self._fetch = fetch
+        self.ttl = ttl
+        self._derive = derive
+        self._parse = parse
+        self._max_versions = max_versions
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._inflight = None
+        self._versions = OrderedDict()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Call `callback(snapshot)` whenever a new version is installed"""
+        self._listeners.append(callback)
+
+    def get(self, max_age=None):
+        """Return the current snapshot, revalidating upstream when it is older than the TTL"""
+        max_age = self.ttl if max_age is None else max_age
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < max_age:
+            cache_result(self.name, 'hit')
+            return snapshot
+
+        with self._lock:
+            flight = self._inflight
+            leader = flight is None
+            if leader:
+                flight = self._inflight = _Flight()
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = self._revalidate()
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight = None
+            flight.done.set()
+
+    def get_version(self, sha):
+        """Return a recently seen snapshot by sha, or None"""
+        with self._lock:
+            return self._versions.get(sha)
+
+    def invalidate(self):
+        """Force the next get() to revalidate upstream"""
+        self._checked_at = 0.0
+
+    def prime(self, sha, content, etag=None):
+        """Install a known version (e.g. one we just wrote) without a fetch"""
+        snapshot = Snapshot(sha, content, etag=etag, derive=self._derive, parse=self._parse)
+        self._install(snapshot)
+        return snapshot
+
+    def _revalidate(self):
+        current = self._snapshot
+        etag = current.etag if current is not None else None
+        try:
+            with phase('upstream_fetch'):
+                response = self._fetch(etag)
+        except Exception as e:
+            return self._stale_or_raise(current, 502, str(e))
+
+        if response.status_code == 304 and current is not None:
+            cache_result(self.name, 'revalidated')
+            self._checked_at = time.monotonic()
+            return current
+        if response.status_code != 200:
+            return self._stale_or_raise(current, response.status_code, response.text)
+
+        data = response.json()
+        with phase('base64_decode'):
+            content = base64.b64decode(data['content']).decode('utf-8')
+        if current is not None and data['sha'] == current.sha and content == current.content:
+            # Same version: skip the parse and derived views
+            cache_result(self.name, 'revalidated')
+            self._checked_at = time.monotonic()
+            return current
+
+        cache_result(self.name, 'miss')
+        headers = getattr(response, 'headers', None) or {}
+        snapshot = Snapshot(
+            data['sha'], content,
+            etag=headers.get('ETag'), derive=self._derive, parse=self._parse
+        )
+        self._install(snapshot)
+        return snapshot
+
+    def _install(self, snapshot):
+        with self._lock:
+            previous = self._snapshot
+            self._snapshot = snapshot
+            self._checked_at = time.monotonic()
+            self._versions[snapshot.sha] = snapshot
+            self._versions.move_to_end(snapshot.sha)
+            while len(self._versions) > self._max_versions:
+                self._versions.popitem(last=False)
+        if previous is None or previous.sha != snapshot.sha:
+            for callback in list(self._listeners):
+                try:
+                    callback(snapshot)
+                except Exception:
+                    log.exception("Cache listener failed", extra={'cache': self.name})
+
+    def _stale_or_raise(self, current, status_code, details):
+        if current is None:
+            raise UpstreamError(status_code, details)
+        cache_result(self.name, 'stale')
+        self._checked_at = time.monotonic()
+        log.warning(
+            "Upstream fetch failed, serving cached version",
+            extra={'cache': self.name, 'status': status_code, 'sha': current.sha}
+        )
+        return current
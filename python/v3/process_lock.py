@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""Reentrant lock shared by the threads of this process and by other processes"""
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+def _lock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after ~10 s; keep waiting like flock does
+            time.sleep(0.1)
+
+
+def _unlock_file(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+class ProcessLock:
+    """Drop-in for ``threading.RLock`` that also excludes other processes
+
+    Threads queue on an in-process RLock; the outermost holder additionally
+    takes an exclusive lock on ``path``, so every process that opens the
+    same lock file serializes its git operations on a shared clone.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self):
+        self._local.acquire()
+        if self._depth == 0:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                _lock_file(fd)
+            except BaseException:
+                os.close(fd)
+                self._local.release()
+                raise
+            self._fd = fd
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fd, self._fd = self._fd, None
+            try:
+                _unlock_file(fd)
+            finally:
+                os.close(fd)
+        self._local.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, *exc):
+        self.release()
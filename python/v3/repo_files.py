@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+"""Read any repository file from the deploy-key mirror or the GitHub contents API"""
+import threading
+import time
+
+from overrides_cache import SnapshotCache, UpstreamError
+from repo_mirror import DEFAULT_TRACKED_EXTENSIONS
+
+
+class RepoFile:
+    """One version of a repository file as text"""
+
+    __slots__ = ('path', 'version', 'text')
+
+    def __init__(self, path, version, text):
+        self.path = path
+        self.version = version
+        self.text = text
+
+
+class RepoFiles:
+    """Uniform, cached access to repository files
+
+    With a mirror, reads come straight from its in-memory snapshot and the
+    version is the blob sha. Otherwise each path gets its own
+    ``SnapshotCache`` revalidated with conditional contents-API requests.
+    """
+
+    def __init__(self, github, owner, repo, mirror=None, ttl=5.0, branch='master',
+                 tracked_extensions=DEFAULT_TRACKED_EXTENSIONS):
+        self.github = github
+        self.owner = owner
+        self.repo = repo
+        self.mirror = mirror
+        self.ttl = ttl
+        self.branch = branch
+        self.tracked_extensions = tuple(tracked_extensions)
+        self._caches = {}
+        self._lock = threading.Lock()
+        self._listing = None
+        self._listing_etag = None
+        self._listing_checked_at = 0.0
+        self._listing_lock = threading.Lock()
+
+    def read(self, path):
+        """Return the current RepoFile for `path` (raises UpstreamError if missing)"""
+        if self.mirror:
+            snapshot = self.mirror.snapshot
+            if snapshot is None:
+                raise UpstreamError(503, f"Mirror is not ready yet: {self.mirror.last_error or 'cloning'}")
+            raw = snapshot.read(path)
+            if raw is None:
+                raise UpstreamError(404, f"{path} not found in mirror")
+            return RepoFile(path, snapshot.blobs[path], raw.decode('utf-8'))
+
+        cached = self._cache(path).get()
+        return RepoFile(path, cached.sha, cached.content)
+
+    def listing(self):
+        """Return {path: version} of every tracked file
+
+        From the mirror snapshot, or from one recursive git trees request
+        revalidated with its ETag at most once per TTL.
+        """
+        if self.mirror:
+            snapshot = self.mirror.snapshot
+            if snapshot is None:
+                raise UpstreamError(503, f"Mirror is not ready yet: {self.mirror.last_error or 'cloning'}")
+            return dict(snapshot.blobs)
+
+        with self._listing_lock:
+            if self._listing is not None and time.monotonic() - self._listing_checked_at < self.ttl:
+                return self._listing
+            headers = {'If-None-Match': self._listing_etag} if self._listing_etag else None
+            response = self.github.get(
+                f"/repos/{self.owner}/{self.repo}/git/trees/{self.branch}?recursive=1", headers=headers
+            )
+            if response.status_code == 304 and self._listing is not None:
+                self._listing_checked_at = time.monotonic()
+                return self._listing
+            if response.status_code != 200:
+                raise UpstreamError(response.status_code, response.text)
+            self._listing = {
+                entry['path']: entry['sha']
+                for entry in response.json().get('tree', [])
+                if entry.get('type') == 'blob' and entry['path'].lower().endswith(self.tracked_extensions)
+            }
+            self._listing_etag = response.headers.get('ETag')
+            self._listing_checked_at = time.monotonic()
+            return self._listing
+
+    def _cache(self, path):
+        with self._lock:
+            cache = self._caches.get(path)
+            if cache is None:
+                cache = SnapshotCache(
+                    lambda etag, path=path: self._fetch(path, etag),
+                    ttl=self.ttl,
+                    parse=None,
+                    name='repo_files'
+                )
+                self._caches[path] = cache
+            return cache
+
+    def invalidate(self, path=None):
+        """Force the next read of `path` (or of every path) to revalidate"""
+        self._listing_checked_at = 0.0
+        with self._lock:
+            caches = [self._caches[path]] if path in self._caches else (
+                list(self._caches.values()) if path is None else []
+            )
+        for cache in caches:
+            cache.invalidate()
+
+    def _fetch(self, path, etag=None):
+        headers = {'If-None-Match': etag} if etag else None
+        return self.github.get(f"/repos/{self.owner}/{self.repo}/contents/{path}", headers=headers)
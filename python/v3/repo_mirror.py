@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+"""Background-synced, in-memory mirror of the deploy-key git clone"""
+import logging
+import os
+import shutil
+import subprocess
+import threading
+import time
+from types import MappingProxyType
+
+from instrumentation import phase
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TRACKED_EXTENSIONS = ('.json', '.yaml', '.yml', '.csv')
+
+
+class MirrorSnapshot:
+    """Immutable copy of the tracked files at one commit"""
+
+    __slots__ = ('commit', 'files', 'blobs', 'synced_at')
+
+    def __init__(self, commit, files, blobs):
+        object.__setattr__(self, 'commit', commit)
+        object.__setattr__(self, 'files', MappingProxyType(dict(files)))
+        object.__setattr__(self, 'blobs', MappingProxyType(dict(blobs)))
+        object.__setattr__(self, 'synced_at', time.time())
+
+    def __setattr__(self, name, value):
+        raise AttributeError('MirrorSnapshot is immutable')
+
+    def read(self, path):
+        """Return the bytes of a tracked file, or None if it is not tracked"""
+        return self.files.get(path)
+
+
+class RepoMirror:
+    """Keep a clone in sync in the background and serve reads from memory
+
+    Every git command that touches the working tree runs under ``lock``, so
+    the sync worker and the write path never race on the same clone. Pass a
+    ``ProcessLock`` so another process on the same clone (an overlapping
+    restart) is excluded as well, and a ``watch_interval`` to pick up its
+    commits by watching the branch ref instead of waiting for the next fetch.
+    Readers only ever see a fully built ``MirrorSnapshot``; listeners are
+    called with ``(old, new, changed_paths)`` whenever the commit changes.
+
+    With a ``clone_url`` the clone is created on demand: shallow, without
+    blobs up front and sparse-checked-out to the tracked extensions, so a
+    first start only downloads the files the app serves. The clone lives
+    in ``repo_dir`` across restarts; later starts publish it immediately and
+    fetch just the new commits in the background.
+    """
+
+    def __init__(self, repo_dir, branch='master', interval=30.0,
+                 tracked_extensions=DEFAULT_TRACKED_EXTENSIONS, lock=None, watch_interval=None,
+                 clone_url=None, retry_interval=5.0):
+        self.repo_dir = repo_dir
+        self.branch = branch
+        self.interval = interval
+        self.tracked_extensions = tuple(tracked_extensions)
+        self.lock = lock or threading.RLock()
+        self.watch_interval = watch_interval
+        self.clone_url = clone_url
+        self.retry_interval = retry_interval
+        self.last_error = None
+        self._snapshot = None
+        self._ready = threading.Event()
+        self._listeners = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._waiters = []
+        self._waiters_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    @property
+    def ready(self):
+        """True once a snapshot has been published"""
+        return self._ready.is_set()
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def is_cloned(self):
+        return os.path.isdir(os.path.join(self.repo_dir, '.git'))
+
+    def start(self):
+        """Start the sync worker without waiting for the network
+
+        An existing clone is published right away (no fetch) and then
+        brought up to date by the worker; a missing one is cloned by the
+        worker, and ``snapshot`` stays None until that finished.
+        """
+        if self.is_cloned():
+            try:
+                self.refresh()
+            except subprocess.CalledProcessError as e:
+                self.last_error = e.stderr.decode(errors='replace') if e.stderr else str(e)
+                log.warning("Existing clone is unusable", extra={'error': self.last_error})
+        # First pass clones or fetches the commits made while we were down
+        self._wake.set()
+        self._thread = threading.Thread(target=self._run, name='repo-mirror-sync', daemon=True)
+        self._thread.start()
+        if self.watch_interval:
+            threading.Thread(target=self._watch, name='repo-mirror-watch', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def request_sync(self, wait=False, timeout=30.0):
+        """Ask the worker to fetch now; optionally block until that sync finished"""
+        done = threading.Event()
+        with self._waiters_lock:
+            self._waiters.append(done)
+        self._wake.set()
+        if wait:
+            done.wait(timeout)
+        return self._snapshot
+
+    def git(self, *args):
+        """Run a git command in the clone and return its stdout"""
+        return self._git(*args)
+
+    def rev_parse(self, rev):
+        return self._git('rev-parse', '--verify', rev).strip()
+
+    def read_blob(self, blob):
+        with phase('git_cat-file'):
+            return subprocess.run(
+                ["git", "cat-file", "blob", blob],
+                cwd=self.repo_dir,
+                check=True,
+                capture_output=True
+            ).stdout
+
+    def unshallow(self):
+        """Fetch the full commit history (commits and trees only with the blob filter)"""
+        with self.lock:
+            if self._git('rev-parse', '--is-shallow-repository').strip() == 'true':
+                self._git('fetch', '--unshallow', 'origin', self.branch)
+
+    def fetch_missing_blobs(self, blobs, revisions=('HEAD',)):
+        """Download the given blobs the partial clone lacks in one request; return the count
+
+        Only the objects of `revisions` (e.g. ``old..new``) are checked.
+        ``rev-list --missing=print`` reports missing objects without the
+        lazy fetch ``cat-file`` would trigger. This only adds objects, so
+        it runs without the mirror lock.
+        """
+        missing = set()
+        listing = self._git('rev-list', '--objects', '--missing=print', *revisions)
+        for line in listing.splitlines():
+            if line.startswith('?') and line[1:] in blobs:
+                missing.add(line[1:])
+        if missing:
+            # The same request git makes for a lazy fetch, batched
+            self._git(
+                '-c', 'fetch.negotiationAlgorithm=noop', 'fetch', 'origin', '--no-tags',
+                '--no-write-fetch-head', '--recurse-submodules=no', '--filter=blob:none', '--stdin',
+                input=''.join(f"{blob}\n" for blob in sorted(missing)).encode()
+            )
+        return len(missing)
+
+    def blob_at(self, commit, path):
+        """Return the blob sha of `path` at `commit`, or None"""
+        try:
+            return self._git('rev-parse', f'{commit}:{path}').strip()
+        except subprocess.CalledProcessError:
+            return None
+
+    def clone(self):
+        """Create the shallow, blob-filtered, sparse clone (no-op if present)"""
+        with self.lock:
+            if self.is_cloned():
+                return
+            if not self.clone_url:
+                raise RuntimeError(f"No clone in {self.repo_dir} and no clone URL configured")
+            # Leftovers of an interrupted clone would make `git clone` refuse
+            if os.path.isdir(self.repo_dir) and os.listdir(self.repo_dir):
+                shutil.rmtree(self.repo_dir)
+            parent = os.path.dirname(os.path.abspath(self.repo_dir))
+            os.makedirs(parent, exist_ok=True)
+            started = time.perf_counter()
+            with phase('git_clone'):
+                subprocess.run(
+                    ["git", "clone", "--depth", "1", "--filter=blob:none", "--no-checkout",
+                     "--single-branch", "--branch", self.branch, self.clone_url, self.repo_dir],
+                    cwd=parent,
+                    check=True,
+                    capture_output=True
+                )
+            try:
+                patterns = [f'*{ext}' for ext in self.tracked_extensions]
+                self._git('sparse-checkout', 'set', '--no-cone', *patterns)
+                self._git('checkout', self.branch)
+            except subprocess.CalledProcessError:
+                shutil.rmtree(self.repo_dir, ignore_errors=True)
+                raise
+            log.info("Cloned repository", extra={
+                'repo_dir': self.repo_dir, 'ms': round((time.perf_counter() - started) * 1000, 1)
+            })
+
+    def sync(self):
+        """Fetch the remote branch, fast-forward the clone and republish"""
+        with self.lock:
+            if not self.is_cloned():
+                self.clone()
+            self._git('fetch', 'origin', self.branch)
+            self._git('merge', '--ff-only', 'FETCH_HEAD')
+            return self.refresh()
+
+    def refresh(self):
+        """Rebuild the snapshot from the local HEAD (no network)"""
+        with self.lock:
+            commit = self._git('rev-parse', 'HEAD').strip()
+            current = self._snapshot
+            if current is not None and current.commit == commit:
+                return current
+
+            blobs = self._list_tracked_blobs()
+            files = {}
+            reuse = {}
+            if current is not None:
+                # Unchanged blobs keep their bytes from the previous snapshot
+                for path, blob in blobs.items():
+                    if current.blobs.get(path) == blob:
+                        reuse[path] = current.files[path]
+            missing = {path: blob for path, blob in blobs.items() if path not in reuse}
+            files.update(reuse)
+            files.update(self._read_blobs(missing))
+            snapshot = MirrorSnapshot(commit, files, blobs)
+            self._snapshot = snapshot
+            self._ready.set()
+
+        changed = self._changed_paths(current, snapshot)
+        for callback in list(self._listeners):
+            try:
+                callback(current, snapshot, changed)
+            except Exception:
+                log.exception("Mirror listener failed")
+        return snapshot
+
+    def _run(self):
+        while not self._stop.is_set():
+            # Retry a failed first clone sooner than a regular sync
+            self._wake.wait(self.interval if self._ready.is_set() else self.retry_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._waiters_lock:
+                waiters, self._waiters = self._waiters, []
+            try:
+                self.sync()
+                self.last_error = None
+            except subprocess.CalledProcessError as e:
+                self.last_error = e.stderr.decode(errors='replace') if e.stderr else str(e)
+                log.warning("Mirror sync failed", extra={'error': self.last_error})
+            except Exception as e:
+                self.last_error = str(e)
+                log.warning("Mirror sync failed", extra={'error': self.last_error})
+            finally:
+                for done in waiters:
+                    done.set()
+
+    def _watch(self):
+        """Refresh when another process moves the branch ref (no git subprocess)"""
+        stamp = self._ref_stamp()
+        while not self._stop.wait(self.watch_interval):
+            current = self._ref_stamp()
+            if current != stamp:
+                stamp = current
+                try:
+                    self.refresh()
+                except Exception:
+                    log.exception("Mirror refresh failed")
+
+    def _ref_stamp(self):
+        git_dir = os.path.join(self.repo_dir, '.git')
+        stamp = []
+        for path in (os.path.join(git_dir, 'refs', 'heads', self.branch), os.path.join(git_dir, 'packed-refs')):
+            try:
+                stamp.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def _git(self, *args, input=None):
+        # Name the phase after the subcommand, skipping `-c key=value` options
+        command = next((arg for arg in args if not arg.startswith('-') and '=' not in arg), args[0])
+        with phase(f'git_{command}'):
+            result = subprocess.run(
+                ["git", *args],
+                cwd=self.repo_dir,
+                check=True,
+                capture_output=True,
+                input=input
+            )
+        return result.stdout.decode()
+
+    def _list_tracked_blobs(self):
+        blobs = {}
+        output = self._git('ls-tree', '-r', '-z', 'HEAD')
+        for entry in output.split('\0'):
+            if not entry:
+                continue
+            meta, path = entry.split('\t', 1)
+            _mode, kind, blob = meta.split(' ')
+            if kind == 'blob' and path.lower().endswith(self.tracked_extensions):
+                blobs[path] = blob
+        return blobs
+
+    def _read_blobs(self, blobs):
+        """Read many blobs with a single `git cat-file --batch` process"""
+        if not blobs:
+            return {}
+        order = list(blobs.items())
+        request_bytes = ''.join(f"{blob}\n" for _, blob in order).encode()
+        with phase('git_cat-file'):
+            result = subprocess.run(
+                ["git", "cat-file", "--batch"],
+                cwd=self.repo_dir,
+                check=True,
+                capture_output=True,
+                input=request_bytes
+            )
+        out = result.stdout
+        files = {}
+        pos = 0
+        for path, _blob in order:
+            header_end = out.index(b'\n', pos)
+            size = int(out[pos:header_end].split(b' ')[2])
+            start = header_end + 1
+            files[path] = out[start:start + size]
+            pos = start + size + 1
+        return files
+
+    @staticmethod
+    def _changed_paths(old, new):
+        if old is None:
+            return set(new.blobs)
+        paths = set(old.blobs) | set(new.blobs)
+        return {path for path in paths if old.blobs.get(path) != new.blobs.get(path)}
@@ -0,0 +1,162 @@
+#!/usr/bin/env python
+"""Columnar, memory-mapped access to target_reaching_task CSV files"""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+from tf_graph import quat_normalize, quat_rotate
+
+# One record per (Exp, SubExp) row, stored sorted by (exp, sub_exp)
+TASK_DTYPE = np.dtype([
+    ('exp', '<i4'),
+    ('sub_exp', '<i4'),
+    ('target', '<f8', (3,)),
+    ('orientation', '<f8', (4,)),
+    ('offset', '<f8', (3,))
+])
+
+CSV_COLUMNS = {
+    'exp': ['Exp'],
+    'sub_exp': ['SubExp'],
+    'target': ['targetx', 'targety', 'targetz'],
+    'orientation': ['orientationx', 'orientationy', 'orientationz', 'orientationw'],
+    'offset': ['offsetx', 'offsety', 'offsetz']
+}
+
+
+def parse_task_csv(text):
+    """Parse task CSV text into a sorted TASK_DTYPE record array"""
+    reader = csv.reader(io.StringIO(text))
+    header = [name.strip() for name in next(reader)]
+    missing = [c for names in CSV_COLUMNS.values() for c in names if c not in header]
+    if missing:
+        raise ValueError(f"Missing task columns: {', '.join(missing)}")
+
+    rows = [row for row in reader if any(cell.strip() for cell in row)]
+    values = np.array(rows, dtype=float).reshape(len(rows), len(header))
+    records = np.empty(len(rows), dtype=TASK_DTYPE)
+    for field, names in CSV_COLUMNS.items():
+        columns = values[:, [header.index(name) for name in names]]
+        records[field] = columns[:, 0] if len(names) == 1 else columns
+    return records[np.lexsort((records['sub_exp'], records['exp']))]
+
+
+class TaskTable:
+    """Task rows as column arrays with an (Exp, SubExp) index
+
+    Final target poses place the offset in the target's own frame:
+    ``position = target + R(orientation) @ offset``.
+    """
+
+    def __init__(self, records, digest=None):
+        self.records = records
+        self.digest = digest
+        self.exp = records['exp']
+        self.sub_exp = records['sub_exp']
+        self.target = records['target']
+        self.orientation = records['orientation']
+        self.offset = records['offset']
+
+        experiments, starts, counts = np.unique(self.exp, return_index=True, return_counts=True)
+        self._experiments = {
+            int(exp): (int(start), int(start + count))
+            for exp, start, count in zip(experiments, starts, counts)
+        }
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def experiments(self):
+        return list(self._experiments)
+
+    def rows(self, exp):
+        """Slice of the rows belonging to experiment `exp`"""
+        if exp not in self._experiments:
+            raise KeyError(exp)
+        return slice(*self._experiments[exp])
+
+    def index(self, exp, sub_exp):
+        """Row number of (exp, sub_exp)"""
+        rows = self.rows(exp)
+        position = rows.start + int(np.searchsorted(self.sub_exp[rows], sub_exp))
+        if position >= rows.stop or self.sub_exp[position] != sub_exp:
+            raise KeyError((exp, sub_exp))
+        return position
+
+    def final_poses(self, exp=None):
+        """Offset target positions (N, 3) and orientations (N, 4) of one or all experiments"""
+        rows = slice(None) if exp is None else self.rows(exp)
+        orientation = quat_normalize(self.orientation[rows])
+        position = self.target[rows] + quat_rotate(orientation, self.offset[rows])
+        return position, orientation
+
+    def experiment_dict(self, exp):
+        position, orientation = self.final_poses(exp)
+        rows = self.rows(exp)
+        return {
+            'exp': exp,
+            'sub_exps': self.sub_exp[rows].tolist(),
+            'targets': self.target[rows].tolist(),
+            'offsets': self.offset[rows].tolist(),
+            'positions': position.tolist(),
+            'orientations': orientation.tolist()
+        }
+
+
+class TaskTableCache:
+    """Binary `.npy` cache of parsed task tables keyed by CSV path and hash
+
+    Tables are opened with ``mmap_mode='r'`` so large generated task sets are
+    paged in on demand; a cache file is rebuilt only when the CSV's sha256
+    changes.
+    """
+
+    def __init__(self, cache_dir=None, max_tables=8):
+        self.max_tables = max_tables
+        self.cache_dir = Path(cache_dir or Path(tempfile.gettempdir()) / 'twobar_task_cache')
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._tables = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, text, name='tasks'):
+        """Return the TaskTable for CSV `text`, reusing the cached arrays if possible"""
+        raw = text.encode('utf-8') if isinstance(text, str) else text
+        digest = hashlib.sha256(raw).hexdigest()
+        # Same-named CSVs in different directories get separate cache files
+        prefix = f"{Path(name).stem}-{hashlib.sha1(name.encode('utf-8')).hexdigest()[:8]}"
+        path = self.cache_dir / f"{prefix}-{digest[:16]}.npy"
+        with self._lock:
+            table = self._tables.get(path)
+            if table is not None:
+                self._tables.move_to_end(path)
+                return table
+
+            if not path.exists():
+                records = parse_task_csv(raw.decode('utf-8'))
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.npy.tmp')
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, records)
+                os.replace(tmp_path, path)
+                # Drop cache files of older versions of the same CSV
+                for old in self.cache_dir.glob(f"{prefix}-*.npy"):
+                    if old != path:
+                        self._tables.pop(old, None)
+                        try:
+                            old.unlink(missing_ok=True)
+                        except OSError:
+                            # Still mapped by a table in use (Windows); removed after the next change
+                            pass
+
+            table = TaskTable(np.load(path, mmap_mode='r'), digest)
+            self._tables[path] = table
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+            return table
@@ -0,0 +1,474 @@
+#!/usr/bin/env python
+"""Step-length telemetry publisher for the two-bar visualizer (ZeroMQ PUB)
+
+Samples come in through ``push``/``push_many`` (any thread) or a PULL
+socket a sensor process writes to, land in a bounded ring buffer and go
+out as batched frames on the port and topic of ``zeromq_settings``.
+Every frame is a single ZeroMQ part, ``<topic> <json>``, so subscribers can
+filter on ``subscriptionFilter`` and may set ZMQ_CONFLATE to keep only the
+newest frame.
+"""
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+from instrumentation import METRICS
+from overrides_cache import UpstreamError
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TOPIC = 'step'
+
+TELEMETRY_SAMPLES = METRICS.counter(
+    'visualizer_telemetry_samples_total',
+    'Step-length samples by result (published, conflated)',
+    ('result',)
+)
+TELEMETRY_FRAMES = METRICS.counter(
+    'visualizer_telemetry_frames_total',
+    'Telemetry frames sent by kind (samples, config)',
+    ('kind',)
+)
+
+
+class TelemetryConfig:
+    """Publisher settings derived from the visualization files"""
+
+    def __init__(self, port, server_ip, subscription_filter, reference_area, reference_line,
+                 step_trigger, version):
+        self.port = port
+        self.server_ip = server_ip
+        self.subscription_filter = subscription_filter
+        self.reference_area = reference_area
+        self.reference_line = reference_line
+        self.step_trigger = step_trigger
+        self.version = version
+
+    @property
+    def topic(self):
+        # SUB sockets match on prefix, so the filter itself is a topic every subscriber receives
+        return self.subscription_filter or DEFAULT_TOPIC
+
+    @classmethod
+    def from_documents(cls, config, step_trigger=None, overrides=None, version=None):
+        zmq_settings = config.get('zeromq_settings', {})
+        connection = zmq_settings.get('connectionSettings', {})
+        settings = config.get('visualizer_settings', {})
+
+        area = settings.get('referenceAreaSettings', {})
+        reference_area = {
+            'enabled': bool(area.get('useReferenceArea', False)),
+            'min': area.get('referenceAreaMin'),
+            'max': area.get('referenceAreaMax')
+        }
+        line = settings.get('referenceLineSettings', {})
+        reference_line = {
+            'enabled': bool(line.get('useReferenceLine', False)),
+            'value': line.get('referenceLineValue')
+        }
+
+        # Enabled runtime overrides win over the base configuration
+        overrides = (overrides or {}).get('visualization_overrides', {})
+        if overrides.get('enabled'):
+            if 'referenceArea' in overrides:
+                reference_area.update(
+                    enabled=True,
+                    min=overrides['referenceArea'].get('min', reference_area['min']),
+                    max=overrides['referenceArea'].get('max', reference_area['max'])
+                )
+            if 'referenceLine' in overrides:
+                reference_line['value'] = overrides['referenceLine'].get('value', reference_line['value'])
+
+        trigger = dict((step_trigger or {}).get('step_trigger_config', {}))
+        trigger.setdefault('enabled', False)
+        trigger.setdefault('negativeStepCountThreshold', 0)
+
+        return cls(
+            port=int(connection.get('port', 5555)),
+            server_ip=connection.get('serverIp'),
+            subscription_filter=zmq_settings.get('subscriptionFilter', ''),
+            reference_area=reference_area,
+            reference_line=reference_line,
+            step_trigger=trigger,
+            version=version
+        )
+
+    def to_dict(self):
+        return {
+            'type': 'config',
+            'version': self.version,
+            'port': self.port,
+            'server_ip': self.server_ip,
+            'topic': self.topic,
+            'reference_area': self.reference_area,
+            'reference_line': self.reference_line,
+            'step_trigger': self.step_trigger
+        }
+
+
+class TelemetryConfigSource:
+    """Build the TelemetryConfig from the files listed in startup.json
+
+    The config is rebuilt only when one of its input files changes version,
+    so polling it from the publisher loop is a few dictionary lookups.
+    """
+
+    KEYS = ('two_bar_step_visualization_config_path', 'step_trigger_config_path',
+            'visualization_overrides_path')
+
+    def __init__(self, files, startup_path='startup.json'):
+        self.files = files
+        self.startup_path = startup_path
+        self._config = None
+        self._lock = threading.Lock()
+
+    def input_paths(self):
+        lists = self._visualization_lists()
+        return {self.startup_path, *(lists[key] for key in self.KEYS if lists.get(key))}
+
+    def config(self):
+        lists = self._visualization_lists()
+        inputs = {}
+        for key in self.KEYS:
+            path = lists.get(key)
+            if not path:
+                continue
+            try:
+                inputs[key] = self.files.read(path)
+            except UpstreamError as e:
+                # Only the bar configuration is required
+                if e.status_code != 404 or key == self.KEYS[0]:
+                    raise
+        version = '/'.join(inputs[key].version if key in inputs else '-' for key in self.KEYS)
+
+        with self._lock:
+            if self._config is not None and self._config.version == version:
+                return self._config
+            documents = {key: json.loads(item.text) for key, item in inputs.items()}
+            self._config = TelemetryConfig.from_documents(
+                documents[self.KEYS[0]],
+                documents.get(self.KEYS[1]),
+                documents.get(self.KEYS[2]),
+                version=version
+            )
+            return self._config
+
+    def _visualization_lists(self):
+        return json.loads(self.files.read(self.startup_path).text).get('visualization_lists', {})
+
+
+class SampleBuffer:
+    """Fixed-size ring of (t, left, right) samples
+
+    A full buffer overwrites its oldest samples, so a stalled sender costs
+    at most ``capacity`` samples of memory; overwritten samples are counted
+    as conflated.
+    """
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._data = np.empty((capacity, 3), dtype=np.float64)
+        self._start = 0
+        self._size = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def extend(self, samples):
+        """Append an (n, 3) array"""
+        samples = np.asarray(samples, dtype=np.float64).reshape(-1, 3)
+        with self._lock:
+            overflow = max(0, self._size + len(samples) - self.capacity)
+            if len(samples) > self.capacity:
+                samples = samples[-self.capacity:]
+            if overflow:
+                self._start = (self._start + min(overflow, self._size)) % self.capacity
+                self._size -= min(overflow, self._size)
+                self.dropped += overflow
+            end = (self._start + self._size) % self.capacity
+            first = min(len(samples), self.capacity - end)
+            self._data[end:end + first] = samples[:first]
+            self._data[:len(samples) - first] = samples[first:]
+            self._size += len(samples)
+
+    def drain(self, limit):
+        """Remove everything; return the newest `limit` samples and the count of older ones"""
+        with self._lock:
+            size, start = self._size, self._start
+            self._start = self._size = 0
+            dropped, self.dropped = self.dropped, 0
+            if size == 0:
+                return np.empty((0, 3)), dropped
+            skip = max(0, size - limit)
+            index = (start + skip + np.arange(size - skip)) % self.capacity
+            return self._data[index], dropped + skip
+
+
+class StepTelemetryPublisher:
+    """Batch, conflate and publish step-length samples to the bars
+
+    All socket work happens on one thread. Every ``batch_interval`` the
+    buffered samples go out as one frame; if more than ``max_batch`` piled
+    up, only the newest are sent (the bars only show the latest value) and
+    the rest are reported as ``dropped``. Each subscriber's queue is capped
+    by ``sndhwm`` frames, after which ZeroMQ drops frames for that
+    subscriber only. The config is re-read every ``config_interval`` (or on
+    ``reload``): a new port rebinds, and reference-area or step-trigger
+    changes take effect with the next batch and are announced in a config
+    frame, which is also repeated for subscribers that joined late.
+    """
+
+    def __init__(self, config_source, bind_host='*', input_endpoint=None, batch_interval=0.01,
+                 max_batch=256, buffer_size=4096, sndhwm=100, config_interval=1.0, context=None):
+        self.config_source = config_source
+        self.bind_host = bind_host
+        self.input_endpoint = input_endpoint
+        self.batch_interval = batch_interval
+        self.max_batch = max_batch
+        self.sndhwm = sndhwm
+        self.config_interval = config_interval
+        self.buffer = SampleBuffer(buffer_size)
+        self.last_error = None
+        self._context = context
+        self._config = None
+        self._endpoint = None
+        self._retiring = None
+        self._input_bound = False
+        self._announce_until = 0.0
+        self._seq = 0
+        self._negative_run = np.zeros(2, dtype=np.int64)
+        self._sent = {'frames': 0, 'samples': 0, 'dropped': 0}
+        self._reload = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        import zmq  # optional dependency, only needed when telemetry is enabled
+
+        self._zmq = zmq
+        if self._context is None:
+            self._context = zmq.Context.instance()
+        self._thread = threading.Thread(target=self._run, name='step-telemetry', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=2.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def reload(self):
+        """Re-read the configuration before the next batch"""
+        self._reload.set()
+
+    def push(self, left, right, timestamp=None):
+        self.buffer.extend(((time.time() if timestamp is None else timestamp, left, right),))
+
+    def push_many(self, timestamps, left, right):
+        self.buffer.extend(np.column_stack((timestamps, left, right)))
+
+    def status(self):
+        config = self._config
+        return {
+            'endpoint': self._endpoint,
+            'input_endpoint': self.input_endpoint,
+            'topic': config.topic if config else None,
+            'config': config.to_dict() if config else None,
+            'buffered': len(self.buffer),
+            'sent': dict(self._sent),
+            'error': self.last_error
+        }
+
+    def _run(self):
+        zmq = self._zmq
+        pub = self._context.socket(zmq.PUB)
+        pub.setsockopt(zmq.SNDHWM, self.sndhwm)
+        pub.setsockopt(zmq.LINGER, 0)
+        pull = None
+        if self.input_endpoint:
+            pull = self._context.socket(zmq.PULL)
+            pull.setsockopt(zmq.RCVHWM, 10000)
+            pull.setsockopt(zmq.LINGER, 0)
+        poller = zmq.Poller()
+        if pull is not None:
+            poller.register(pull, zmq.POLLIN)
+
+        next_batch = time.monotonic()
+        next_config = next_batch
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if now >= next_config or self._reload.is_set():
+                    self._reload.clear()
+                    self._refresh_config(pub)
+                    if pull is not None and self._endpoint and not self._input_bound:
+                        # Only the process that owns the PUB port takes sensor input
+                        try:
+                            pull.bind(self.input_endpoint)
+                            self._input_bound = True
+                        except zmq.ZMQError as e:
+                            self.last_error = f"bind {self.input_endpoint}: {e}"
+                            log.warning("Telemetry input could not bind", extra={'error': self.last_error})
+                    next_config = now + self.config_interval
+                if now >= next_batch:
+                    if self._endpoint:
+                        self._send_batch(pub)
+                    next_batch = now + self.batch_interval
+
+                timeout = max(0.0, min(next_batch, next_config) - time.monotonic())
+                if pull is None:
+                    self._stop.wait(timeout)
+                    continue
+                for _socket, _event in poller.poll(timeout * 1000):
+                    self._receive(pull)
+        finally:
+            pub.close()
+            if pull is not None:
+                pull.close()
+
+    def _receive(self, pull):
+        """Drain the relay input: JSON samples or packed float64 (t, left, right) triples"""
+        zmq = self._zmq
+        while True:
+            try:
+                message = pull.recv(zmq.NOBLOCK)
+            except zmq.Again:
+                return
+            try:
+                self.buffer.extend(self._decode_input(message))
+            except (ValueError, KeyError, TypeError) as e:
+                log.warning("Ignoring malformed telemetry input", extra={'error': str(e)})
+
+    @staticmethod
+    def _decode_input(message):
+        if message[:1] in (b'{', b'['):
+            try:
+                return parse_samples(json.loads(message))
+            except ValueError:
+                # Packed floats can start with the same byte
+                if len(message) % 24:
+                    raise
+        return np.frombuffer(message, dtype='<f8')
+
+    def _refresh_config(self, pub):
+        try:
+            config = self.config_source.config()
+        except Exception as e:
+            self.last_error = str(e)
+            log.warning("Telemetry config unavailable", extra={'error': self.last_error})
+            return
+
+        previous, self._config = self._config, config
+        if self._retiring and (config.port != previous.port or time.monotonic() >= self._retiring[1]):
+            pub.unbind(self._retiring[0])
+            self._retiring = None
+        endpoint = f"tcp://{self.bind_host}:{config.port}"
+        if self._endpoint != endpoint:
+            try:
+                pub.bind(endpoint)
+            except self._zmq.ZMQError as e:
+                # Another worker may own the port; keep retrying so it can take over
+                self.last_error = f"bind {endpoint}: {e}"
+                log.warning("Telemetry publisher could not bind", extra={'error': self.last_error})
+            else:
+                if self._endpoint:
+                    # Keep the old port for a while so its subscribers learn the new one
+                    self._retiring = (self._endpoint, time.monotonic() + 2 * self.config_interval)
+                self._endpoint = endpoint
+                log.info("Telemetry publisher bound", extra={'endpoint': endpoint, 'topic': config.topic})
+        if previous is None or config.version != previous.version:
+            if previous is None or config.step_trigger != previous.step_trigger:
+                self._negative_run[:] = 0
+            # Conflating subscribers may never see a config frame; repeat it in sample frames
+            self._announce_until = time.monotonic() + 2 * self.config_interval
+            log.info("Telemetry config loaded", extra={'version': config.version})
+        if self._endpoint == endpoint:
+            self.last_error = None
+            self._send(pub, config.to_dict(), 'config')
+
+    def _send_batch(self, pub):
+        samples, dropped = self.buffer.drain(self.max_batch)
+        if dropped:
+            TELEMETRY_SAMPLES.inc(dropped, result='conflated')
+            self._sent['dropped'] += dropped
+        if not len(samples):
+            return
+
+        config = self._config
+        latest = samples[-1]
+        frame = {
+            'type': 'samples',
+            'seq': self._seq,
+            'config_version': config.version,
+            'dropped': dropped,
+            't': samples[:, 0].tolist(),
+            'left': np.round(samples[:, 1], 4).tolist(),
+            'right': np.round(samples[:, 2], 4).tolist(),
+            'latest': {
+                't': float(latest[0]),
+                'left': float(latest[1]),
+                'right': float(latest[2]),
+                'in_reference_area': self._in_reference_area(latest[1:], config)
+            }
+        }
+        if time.monotonic() < self._announce_until:
+            frame['config'] = config.to_dict()
+        triggered = self._update_step_trigger(samples[:, 1:], config)
+        if triggered is not None:
+            frame['step_trigger'] = triggered
+        self._seq += 1
+        self._send(pub, frame, 'samples')
+        TELEMETRY_SAMPLES.inc(len(samples), result='published')
+        self._sent['samples'] += len(samples)
+
+    def _send(self, pub, payload, kind):
+        zmq = self._zmq
+        topic = self._config.topic
+        try:
+            pub.send(topic.encode() + b' ' + json.dumps(payload, separators=(',', ':')).encode(), zmq.NOBLOCK)
+        except zmq.Again:
+            return
+        TELEMETRY_FRAMES.inc(kind=kind)
+        self._sent['frames'] += 1
+
+    @staticmethod
+    def _in_reference_area(values, config):
+        area = config.reference_area
+        if not area['enabled'] or area['min'] is None or area['max'] is None:
+            return None
+        return [bool(area['min'] <= value <= area['max']) for value in values]
+
+    def _update_step_trigger(self, values, config):
+        """Track consecutive negative steps per bar; report bars that just hit the threshold"""
+        trigger = config.step_trigger
+        if not trigger['enabled'] or trigger['negativeStepCountThreshold'] <= 0:
+            return None
+        negative = values < 0
+        index = np.arange(len(values))[:, None]
+        # Run length after every sample: reset by a non-negative step, else carried over
+        last_reset = np.maximum.accumulate(np.where(negative, -1, index), axis=0)
+        runs = np.where(last_reset < 0, self._negative_run + index + 1, index - last_reset)
+        self._negative_run = runs[-1].copy()
+
+        # Runs grow by one, so a run reaching the threshold passes through it exactly
+        fired = (runs == trigger['negativeStepCountThreshold']).any(axis=0)
+        if not fired.any():
+            return None
+        return {'bars': [name for name, hit in zip(('left', 'right'), fired) if hit],
+                'negative_run': self._negative_run.tolist()}
+
+
+def parse_samples(message):
+    """Accept {"t", "left", "right"} with scalars or equal-length lists, or a list of those"""
+    if isinstance(message, list):
+        return np.concatenate([parse_samples(item) for item in message]) if message else np.empty((0, 3))
+    left = np.atleast_1d(np.asarray(message['left'], dtype=np.float64))
+    right = np.atleast_1d(np.asarray(message['right'], dtype=np.float64))
+    timestamps = np.atleast_1d(np.asarray(message.get('t', time.time()), dtype=np.float64))
+    if len(timestamps) == 1 and len(left) > 1:
+        timestamps = np.full(len(left), timestamps[0])
+    return np.column_stack((timestamps, left, right))
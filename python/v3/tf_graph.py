@@ -0,0 +1,287 @@
+#!/usr/bin/env python
+"""TF frame graph for the coord_tf_robot_base / calibration_data files
+
+Quaternions are stored as (x, y, z, w), matching the ``qx, qy, qz, qw``
+pose fields. A pose places a child frame in its parent frame, so
+``p_parent = R(q) @ p_child + t``.
+"""
+import json
+import threading
+
+import numpy as np
+
+
+class FrameError(KeyError):
+    """Raised for unknown frames or frames in disconnected trees"""
+
+
+def quat_normalize(q):
+    """Scale (..., 4) quaternions to unit length (ValueError for zero or non-finite ones)"""
+    q = np.asarray(q, dtype=float)
+    norm = np.linalg.norm(q, axis=-1, keepdims=True)
+    if not np.all(np.isfinite(norm)) or np.any(norm == 0.0):
+        raise ValueError("Quaternion must be finite and non-zero")
+    return q / norm
+
+
+def quat_conjugate(q):
+    q = np.asarray(q, dtype=float)
+    return q * np.array([-1.0, -1.0, -1.0, 1.0])
+
+
+def quat_multiply(a, b):
+    """Hamilton product of (..., 4) xyzw quaternion arrays"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    ax, ay, az, aw = np.moveaxis(a, -1, 0)
+    bx, by, bz, bw = np.moveaxis(b, -1, 0)
+    return np.stack([
+        aw * bx + ax * bw + ay * bz - az * by,
+        aw * by - ax * bz + ay * bw + az * bx,
+        aw * bz + ax * by - ay * bx + az * bw,
+        aw * bw - ax * bx - ay * by - az * bz
+    ], axis=-1)
+
+
+def quat_rotate(q, v):
+    """Rotate (..., 3) vectors by (..., 4) quaternions"""
+    q = np.asarray(q, dtype=float)
+    v = np.asarray(v, dtype=float)
+    u = q[..., :3]
+    w = q[..., 3:4]
+    t = 2.0 * np.cross(u, v)
+    return v + w * t + np.cross(u, t)
+
+
+def quat_to_matrix(q):
+    x, y, z, w = quat_normalize(q)
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)]
+    ])
+
+
+def left_to_right_handed(position, quaternion):
+    """Convert a left-handed (Unity) pose to right-handed by mirroring Z"""
+    x, y, z = position
+    qx, qy, qz, qw = quaternion
+    return (x, y, -z), (-qx, -qy, qz, qw)
+
+
+class Transform:
+    """Rigid transform: rotation quaternion plus translation"""
+
+    __slots__ = ('translation', 'rotation')
+
+    def __init__(self, translation=(0.0, 0.0, 0.0), rotation=(0.0, 0.0, 0.0, 1.0)):
+        self.translation = np.asarray(translation, dtype=float)
+        self.rotation = quat_normalize(rotation)
+
+    @classmethod
+    def from_pose(cls, pose, rhcs=True):
+        position = (pose.get('x', 0.0), pose.get('y', 0.0), pose.get('z', 0.0))
+        quaternion = (pose.get('qx', 0.0), pose.get('qy', 0.0), pose.get('qz', 0.0), pose.get('qw', 1.0))
+        # RHCS is a bool in most files but the string "true"/"false" in some
+        if isinstance(rhcs, str):
+            rhcs = rhcs.lower() == 'true'
+        if not rhcs:
+            position, quaternion = left_to_right_handed(position, quaternion)
+        if not np.all(np.isfinite(np.asarray(position, dtype=float))):
+            raise ValueError("Position must be finite")
+        return cls(position, quaternion)
+
+    def compose(self, other):
+        """self ∘ other: apply `other` first, then `self`"""
+        return Transform(
+            self.translation + quat_rotate(self.rotation, other.translation),
+            quat_multiply(self.rotation, other.rotation)
+        )
+
+    def inverse(self):
+        inverse_rotation = quat_conjugate(self.rotation)
+        return Transform(-quat_rotate(inverse_rotation, self.translation), inverse_rotation)
+
+    def apply_points(self, points):
+        """Transform an (N, 3) array of points"""
+        return quat_rotate(self.rotation, points) + self.translation
+
+    def apply_poses(self, positions, quaternions):
+        """Transform (N, 3) positions and (N, 4) quaternions in one batch"""
+        rotations = np.broadcast_to(self.rotation, np.shape(quaternions))
+        return self.apply_points(positions), quat_multiply(rotations, quat_normalize(quaternions))
+
+    def to_dict(self):
+        x, y, z = self.translation.tolist()
+        qx, qy, qz, qw = self.rotation.tolist()
+        return {
+            'pose': {'x': x, 'y': y, 'z': z, 'qx': qx, 'qy': qy, 'qz': qz, 'qw': qw},
+            'matrix': np.vstack([
+                np.hstack([quat_to_matrix(self.rotation), self.translation[:, None]]),
+                [0.0, 0.0, 0.0, 1.0]
+            ]).tolist()
+        }
+
+
+class Frame:
+    __slots__ = ('frame_id', 'parent', 'transform', 'dynamic', 'source')
+
+    def __init__(self, frame_id, parent, transform, dynamic, source):
+        self.frame_id = frame_id
+        self.parent = parent
+        self.transform = transform
+        self.dynamic = dynamic
+        self.source = source
+
+
+class FrameGraph:
+    """Tree of frames with cached root transforms
+
+    Every frame's transform to the root of its tree is composed once and
+    cached. Updating a dynamic frame only drops the cache entries of that
+    frame and its descendants.
+    """
+
+    def __init__(self):
+        self._frames = {}
+        self._children = {}
+        self._root_cache = {}
+        self._lock = threading.RLock()
+
+    def load_data_list(self, document, source=None):
+        """Add the frames of a `{"dataList": [...]}` document; later entries win"""
+        for entry in document.get('dataList', []):
+            data = entry['data']
+            self.set_frame(
+                data['frame_id'],
+                data['parent_frame_id'],
+                Transform.from_pose(data['pose'], rhcs=data.get('RHCS', True)),
+                dynamic=data.get('type') == 'dynamic',
+                source=source
+            )
+
+    def set_frame(self, frame_id, parent, transform, dynamic=False, source=None):
+        with self._lock:
+            previous = self._frames.get(frame_id)
+            if previous is not None:
+                self._children.get(previous.parent, set()).discard(frame_id)
+            self._frames[frame_id] = Frame(frame_id, parent, transform, dynamic, source)
+            self._children.setdefault(parent, set()).add(frame_id)
+            self._invalidate_subtree(frame_id)
+
+    def update_frame(self, frame_id, transform):
+        """Move a dynamic frame; only its subtree is recomputed"""
+        with self._lock:
+            frame = self._frames.get(frame_id)
+            if frame is None:
+                raise FrameError(frame_id)
+            if not frame.dynamic:
+                raise ValueError(f"{frame_id} is a static frame")
+            frame.transform = transform
+            self._invalidate_subtree(frame_id)
+
+    def frames(self):
+        with self._lock:
+            return [
+                {
+                    'frame_id': frame.frame_id,
+                    'parent_frame_id': frame.parent,
+                    'type': 'dynamic' if frame.dynamic else 'static',
+                    'source': frame.source
+                }
+                for frame in self._frames.values()
+            ]
+
+    def lookup(self, source, target):
+        """Transform that maps coordinates in `source` into `target`"""
+        with self._lock:
+            source_root, root_from_source = self._to_root(source)
+            target_root, root_from_target = self._to_root(target)
+        if source_root != target_root:
+            raise FrameError(f"{source} and {target} are not connected")
+        return root_from_target.inverse().compose(root_from_source)
+
+    def transform_points(self, points, source, target):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        return self.lookup(source, target).apply_points(points)
+
+    def transform_poses(self, positions, quaternions, source, target):
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        quaternions = np.asarray(quaternions, dtype=float).reshape(-1, 4)
+        return self.lookup(source, target).apply_poses(positions, quaternions)
+
+    def _to_root(self, frame_id):
+        cached = self._root_cache.get(frame_id)
+        if cached is not None:
+            return cached
+        if frame_id not in self._frames and frame_id not in self._children:
+            raise FrameError(frame_id)
+
+        # Walk up to the first cached ancestor (or the root), then compose down
+        chain = []
+        current = frame_id
+        visited = set()
+        while current in self._frames and current not in self._root_cache:
+            if current in visited:
+                raise FrameError(f"Cycle detected at {current}")
+            visited.add(current)
+            chain.append(current)
+            current = self._frames[current].parent
+        root, transform = self._root_cache.get(current, (current, Transform()))
+        self._root_cache[current] = (root, transform)
+        for frame in reversed(chain):
+            transform = transform.compose(self._frames[frame].transform)
+            self._root_cache[frame] = (root, transform)
+        return self._root_cache[frame_id]
+
+    def _invalidate_subtree(self, frame_id):
+        stack = [frame_id]
+        while stack:
+            current = stack.pop()
+            self._root_cache.pop(current, None)
+            stack.extend(self._children.get(current, ()))
+
+
+class FrameGraphSource:
+    """Build the frame graph from the files referenced by startup.json
+
+    The graph is rebuilt only when one of its files changes; dynamic frame
+    updates received at runtime are replayed on top of each rebuild.
+    """
+
+    def __init__(self, files, startup_path='startup.json',
+                 keys=('robot_base_coord_path', 'calibration_data_path')):
+        self.files = files
+        self.startup_path = startup_path
+        self.keys = keys
+        self._graph = None
+        self._versions = None
+        self._dynamic_updates = {}
+        self._lock = threading.Lock()
+
+    def graph(self):
+        startup = json.loads(self.files.read(self.startup_path).text)
+        ros_info = startup.get('ros_info', {})
+        repo_files = [self.files.read(ros_info[key]) for key in self.keys if ros_info.get(key)]
+        versions = tuple((f.path, f.version) for f in repo_files)
+
+        with self._lock:
+            if self._graph is not None and versions == self._versions:
+                return self._graph
+            graph = FrameGraph()
+            for repo_file in repo_files:
+                graph.load_data_list(json.loads(repo_file.text), source=repo_file.path)
+            for frame_id, transform in self._dynamic_updates.items():
+                try:
+                    graph.update_frame(frame_id, transform)
+                except (FrameError, ValueError):
+                    pass
+            self._graph = graph
+            self._versions = versions
+            return graph
+
+    def update_frame(self, frame_id, transform):
+        graph = self.graph()
+        graph.update_frame(frame_id, transform)
+        with self._lock:
+            self._dynamic_updates[frame_id] = transform
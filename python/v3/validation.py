@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""Schema-compiled validation shared by every write endpoint"""
+import fnmatch
+import json
+import time
+from pathlib import Path
+
+from jsonschema import Draft7Validator
+
+from instrumentation import phase
+
+SCHEMA_DIR = Path(__file__).parent
+
+# Schema name -> (schema file, repository paths it applies to)
+DEFAULT_SCHEMAS = {
+    'visualization_config': ('schema.json', ['visualization/two_bar_step_visualization_config.json']),
+    'visualization_overrides': ('overrides_schema.json', ['visualization/visualization_overrides.json'])
+}
+
+
+def format_path(path):
+    """Turn a jsonschema error path into 'a.b.0.c' form"""
+    return '.'.join(str(part) for part in path)
+
+
+class SchemaValidator:
+    """Compile JSON schemas once and report every error in a single pass"""
+
+    def __init__(self, schemas=None, schema_dir=SCHEMA_DIR):
+        self._validators = {}
+        self._patterns = []
+        for name, (filename, patterns) in (schemas or DEFAULT_SCHEMAS).items():
+            with open(Path(schema_dir) / filename, 'r', encoding='utf-8') as f:
+                schema = json.load(f)
+            Draft7Validator.check_schema(schema)
+            self._validators[name] = Draft7Validator(schema)
+            self._patterns.extend((pattern, name) for pattern in patterns)
+
+    def schema(self, name):
+        return self._validators[name].schema
+
+    def validate(self, name, document):
+        """Return all errors of `document` against schema `name` ([] if valid)"""
+        with phase('validation'):
+            errors = sorted(self._validators[name].iter_errors(document), key=lambda e: list(map(str, e.absolute_path)))
+        return [{'path': format_path(error.absolute_path), 'message': error.message} for error in errors]
+
+    def validate_paths(self, name, document, paths):
+        """Validate only the subtrees touched by a patch
+
+        Each written path is checked by validating its parent object against
+        the matching subschema, which catches bad values as well as removed
+        required keys without re-validating the rest of the document.
+        """
+        parents = sorted({tuple(path[:-1]) for path in paths if path}, key=len)
+        if any(not path for path in paths):
+            parents = [()]
+        # Validating an ancestor already covers its descendants
+        selected = []
+        for parent in parents:
+            if not any(parent[:len(chosen)] == chosen for chosen in selected):
+                selected.append(parent)
+
+        errors = []
+        for parent in selected:
+            subschema = self._subschema(name, parent)
+            node = document
+            missing = False
+            for token in parent:
+                if isinstance(node, dict) and token in node:
+                    node = node[token]
+                elif isinstance(node, list) and token.isdigit() and int(token) < len(node):
+                    node = node[int(token)]
+                else:
+                    missing = True
+                    break
+            if missing:
+                errors.append({'path': format_path(parent), 'message': 'Path does not exist'})
+                continue
+            if subschema is None:
+                continue
+            validator = self._validators[name].evolve(schema=subschema)
+            for error in validator.iter_errors(node):
+                errors.append({
+                    'path': format_path(list(parent) + list(error.absolute_path)),
+                    'message': error.message
+                })
+        return errors
+
+    def _subschema(self, name, tokens):
+        """Walk properties/additionalProperties/items to the schema of a path"""
+        schema = self._validators[name].schema
+        for token in tokens:
+            if not isinstance(schema, dict):
+                return None
+            properties = schema.get('properties', {})
+            if token in properties:
+                schema = properties[token]
+            elif isinstance(schema.get('additionalProperties'), dict):
+                schema = schema['additionalProperties']
+            elif isinstance(schema.get('items'), dict):
+                schema = schema['items']
+            else:
+                return None
+        return schema
+
+    def schema_for_path(self, path):
+        """Return the schema name registered for a repository path, or None"""
+        for pattern, name in self._patterns:
+            if fnmatch.fnmatch(path, pattern):
+                return name
+        return None
+
+    def validate_files(self, files):
+        """Validate many repository files (path -> bytes/str) in one call
+
+        Files without a registered schema are only checked for JSON syntax.
+        Each result carries the time spent on that document.
+        """
+        results = {}
+        for path, raw in files.items():
+            if not path.endswith('.json'):
+                continue
+            started = time.perf_counter()
+            name = self.schema_for_path(path)
+            try:
+                document = json.loads(raw)
+                errors = self.validate(name, document) if name else []
+            except (json.JSONDecodeError, UnicodeDecodeError) as e:
+                errors = [{'path': '', 'message': f'Invalid JSON: {e}'}]
+            results[path] = {
+                'schema': name,
+                'valid': not errors,
+                'errors': errors,
+                'ms': (time.perf_counter() - started) * 1000.0
+            }
+        return results
+
+    def validate_tree(self, root):
+        """Validate every JSON file under a directory (paths relative to it)"""
+        root = Path(root)
+        files = {
+            path.relative_to(root).as_posix(): path.read_bytes()
+            for path in sorted(root.rglob('*.json'))
+        }
+        return self.validate_files(files)
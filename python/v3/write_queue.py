@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+"""Accepted-then-applied write pipeline for visualization overrides"""
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from json_patch import JsonPatchError, diff_paths, paths_overlap
+
+
+class WriteConflict(Exception):
+    """Raised when the upstream file changed under a pending write"""
+
+
+class WriteJob:
+    """One accepted write request and its outcome
+
+    A job either replaces the whole document (``content``) or carries a
+    ``transform(document) -> document`` built from a patch, together with the
+    paths it writes and the document it was computed against.
+    """
+
+    def __init__(self, content, base_sha, client_id=None, transform=None,
+                 paths=None, base_document=None):
+        self.id = uuid.uuid4().hex
+        self.content = content
+        self.base_sha = base_sha
+        self.client_id = client_id
+        self.transform = transform
+        self.paths = paths
+        self.base_document = base_document
+        self.status = 'queued'
+        self.sha = None
+        self.error = None
+        self.merged = 0
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self.done = threading.Event()
+
+    def finish(self, status, sha=None, error=None, merged=0):
+        self.status = status
+        self.sha = sha
+        self.error = error
+        self.merged = merged
+        self.finished_at = time.time()
+        self.done.set()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'base_sha': self.base_sha,
+            'sha': self.sha,
+            'error': self.error,
+            'merged': self.merged,
+            'submitted_at': self.submitted_at,
+            'finished_at': self.finished_at
+        }
+
+
+class WriteQueue:
+    """Debounce bursts of overrides saves and land each burst as one commit
+
+    ``apply_batch(content, base_sha, message)`` performs the upstream write
+    and returns the new sha (raising ``WriteConflict`` on a sha mismatch);
+    ``current_version()`` returns the snapshot (``sha``, ``content``,
+    ``document``) readers currently see.
+
+    A job is accepted if its base sha is the current one, or if every commit
+    since its base was produced by this queue from the same client's edits
+    (a client keeps sending its last-read sha while a burst is in flight).
+    Patch jobs are also accepted when nothing they write changed since
+    their base; they are then replayed on top of the current document.
+    Within a burst each job is also checked against the jobs accepted before
+    it: a whole document from another client conflicts with any earlier
+    change, a patch with changes to the paths it writes. Anything else is
+    reported as a conflict instead of being overwritten.
+    """
+
+    def __init__(self, apply_batch, current_version, same_version=None,
+                 debounce=0.5, max_delay=3.0, history=256):
+        self._apply_batch = apply_batch
+        self._current_version = current_version
+        self._same_version = same_version or (lambda a, b: a == b)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._history = history
+        self._cond = threading.Condition()
+        self._pending = []
+        self._busy = False
+        self._last_submit = 0.0
+        self._jobs = OrderedDict()
+        self._produced = OrderedDict()
+        self._thread = threading.Thread(target=self._run, name='overrides-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, content, base_sha, client_id=None):
+        """Queue a validated document and return its job immediately"""
+        return self._enqueue(WriteJob(content, base_sha, client_id))
+
+    def submit_patch(self, transform, paths, base_sha, base_document, client_id=None):
+        """Queue a validated patch and return its job immediately"""
+        return self._enqueue(WriteJob(
+            None, base_sha, client_id,
+            transform=transform, paths=paths, base_document=base_document
+        ))
+
+    def _enqueue(self, job):
+        with self._cond:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self._history:
+                self._jobs.popitem(last=False)
+            self._pending.append(job)
+            self._last_submit = time.monotonic()
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def wait_idle(self, timeout=None):
+        """Block until every accepted job has been applied; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                first_submit = time.monotonic()
+                while True:
+                    deadline = min(self._last_submit + self.debounce, first_submit + self.max_delay)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._busy = True
+            try:
+                self._apply(batch)
+            finally:
+                with self._cond:
+                    self._busy = False
+                    self._cond.notify_all()
+
+    def _apply(self, batch):
+        for job in batch:
+            job.status = 'applying'
+        try:
+            current = self._current_version()
+        except Exception as e:
+            for job in batch:
+                job.finish('failed', error=f"Could not read current version: {e}")
+            return
+
+        # Replay accepted jobs in arrival order on top of the current version
+        accepted = []
+        content = current.content
+        document = current.document
+        # (client_id, paths written) of every job accepted so far in this batch
+        written = []
+        for job in batch:
+            if not self._accepts(current, job) or self._overwrites(job, written):
+                job.finish('conflict', error=(
+                    f"Overrides changed since version {job.base_sha}; "
+                    f"current version is {current.sha}. Reload and retry."
+                ))
+                continue
+            try:
+                updated = json.loads(job.content) if job.transform is None else job.transform(document)
+            except JsonPatchError as e:
+                job.finish('conflict', error=str(e))
+                continue
+            written.append((job.client_id, diff_paths(document, updated)))
+            document = updated
+            content = job.content if job.transform is None else json.dumps(updated, indent=2)
+            accepted.append(job)
+        if not accepted:
+            return
+
+        message = "Update visualization overrides"
+        if len(accepted) > 1:
+            message += f" ({len(accepted)} edits)"
+        try:
+            new_sha = self._apply_batch(content, current.sha, message)
+        except WriteConflict as e:
+            for job in accepted:
+                job.finish('conflict', error=str(e))
+            return
+        except Exception as e:
+            for job in accepted:
+                job.finish('failed', error=str(e))
+            return
+
+        with self._cond:
+            self._produced[new_sha] = (current.sha, {job.client_id for job in accepted})
+            while len(self._produced) > self._history:
+                self._produced.popitem(last=False)
+        for job in accepted:
+            job.finish('applied', sha=new_sha, merged=len(accepted))
+
+    def _accepts(self, current, job):
+        if self._descends_from(current.sha, job.base_sha, job.client_id):
+            return True
+        if job.transform is None or job.base_document is None:
+            return False
+        # A patch only conflicts if something it writes changed since its base
+        return not paths_overlap(diff_paths(job.base_document, current.document), job.paths)
+
+    @staticmethod
+    def _overwrites(job, written):
+        """True if an earlier job of the batch from another client wrote what `job` writes
+
+        A whole document writes everything, so it conflicts with any such
+        change; a patch only with changes to the paths it writes.
+        """
+        for client_id, paths in written:
+            if not paths or (client_id is not None and client_id == job.client_id):
+                continue
+            if job.transform is None or paths_overlap(paths, job.paths):
+                return True
+        return False
+
+    def _descends_from(self, current, base_sha, client_id):
+        """True if `current` is `base_sha` or only this client's queued edits lie between them"""
+        sha = current
+        for _ in range(self._history):
+            if self._same_version(sha, base_sha):
+                return True
+            with self._cond:
+                produced = self._produced.get(sha)
+            if produced is None or client_id is None or produced[1] != {client_id}:
+                return False
+            sha = produced[0]
+        return False
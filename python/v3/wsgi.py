@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+"""Production entry point
+
+Run a single process with threads; the overrides write queue and its job
+registry live in the process, so several worker processes would answer
+each other's job polls with 404 and turn save bursts into conflicts:
+    python wsgi.py                      # waitress, WSGI_THREADS + CHANGE_FEED_MAX_SUBSCRIBERS threads
+    waitress-serve --threads 40 wsgi:app
+
+Change-feed subscribers (/overrides/stream, /overrides/changes) each hold a
+thread for as long as they are connected, so the pool needs one thread per
+allowed subscriber on top of the request workers.
+"""
+import os
+
+from app2 import VisualizerApp
+
+visualizer = VisualizerApp()
+app = visualizer.app
+
+
+if __name__ == '__main__':
+    from waitress import serve
+
+    serve(
+        app,
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', '5000')),
+        threads=int(os.environ.get('WSGI_THREADS', '8')) + visualizer.feed_max_subscribers
+    )